@@ -6,6 +6,9 @@ import altair as alt
 
 # Importamos tu orquestador
 from core.orchestrator import Orchestrator
+from core import config
+from modules.run_journal import RunJournal
+from modules.excel_reader import count_rows
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(
@@ -42,7 +45,7 @@ st.markdown("""
 # --- FUNCIÓN DE ESTILOS PARA LA TABLA ---
 def highlight_row_low_confidence(row):
     """
-    Pinta TODA la fila de naranja si 'Nivel de Confianza' < 80.
+    Pinta TODA la fila de naranja si 'Nivel de Confianza' < config.REVIEW_CONFIDENCE_THRESHOLD.
     """
     # Color de fondo para filas de baja confianza
     bg_color = 'background-color: #ffeeba; color: black;' # Amarillo suave
@@ -53,7 +56,7 @@ def highlight_row_low_confidence(row):
         val = row.get('Nivel de Confianza', 0)
         score = float(val)
         
-        if score < 80:
+        if score < config.REVIEW_CONFIDENCE_THRESHOLD:
             # Devolvemos el estilo para CADA celda de la fila
             return [bg_color] * len(row)
     except:
@@ -64,6 +67,19 @@ def highlight_row_low_confidence(row):
 
 
 
+def render_pending_evidence(result, indices):
+    """Genera capturas pendientes (todas si indices es None) y refresca la tabla y el Excel."""
+    with st.spinner("Generando evidencia..."):
+        orchestrator = Orchestrator(pool_size=1 if indices else config.POOL_SIZE)
+        rendered = orchestrator.render_evidence(result, indices)
+    
+    if rendered:
+        st.session_state.results = result
+        st.rerun()
+    else:
+        st.warning("No se pudo generar la evidencia (la web no respondió).")
+
+
 def main():
     
     # --- SIDEBAR: CONTROLES ---
@@ -75,6 +91,85 @@ def main():
         st.markdown('---')
         st.info("💡 **Tip:** Asegúrate de que el Excel tiene una columna llamada 'Sitio web'.")
         
+        st.subheader("⚙️ Rendimiento")
+        pool_size = st.number_input(
+            "Navegadores en paralelo (workers)",
+            min_value=1, max_value=16, value=config.POOL_SIZE,
+            help="Procesos Playwright persistentes. Cada uno mantiene un Chromium abierto durante toda la ejecución. Es también el número máximo de webs que se scrapean a la vez."
+        )
+        max_per_host = st.number_input(
+            "Máx. peticiones simultáneas por dominio",
+            min_value=1, max_value=8, value=config.MAX_PER_HOST,
+            help="Cortesía con cada web: evita abrir demasiadas páginas del mismo dominio a la vez."
+        )
+        llm_concurrency = st.number_input(
+            "Llamadas a la IA en paralelo",
+            min_value=1, max_value=32, value=config.LLM_CONCURRENCY,
+            help="Peticiones simultáneas a Gemini. Los límites por minuto de cada modelo (config.LLM_RATE_LIMITS) se respetan igualmente."
+        )
+        llm_batch_size = st.number_input(
+            "Empresas por petición a la IA",
+            min_value=1, max_value=20, value=config.LLM_BATCH_SIZE,
+            help="Agrupa varias empresas en una sola llamada: menos peticiones contra la cuota diaria a cambio de más latencia por lote. 1 = una llamada por empresa."
+        )
+        llm_cascade = st.checkbox(
+            "Cascada de modelos (barato primero)", value=config.LLM_CASCADE_ENABLED,
+            help=f"Clasifica con un modelo ligero y poco contexto; sólo las filas con confianza < {config.REVIEW_CONFIDENCE_THRESHOLD}% se repiten con un modelo fuerte y más contexto."
+        )
+        
+        preflight = st.checkbox(
+            "Pre-chequeo DNS/TCP", value=config.PREFLIGHT_ENABLED,
+            help="Descarta dominios caducados o caídos antes de abrir el navegador (evita esperar el timeout de 20 s)."
+        )
+        
+        dedup = st.checkbox(
+            "Analizar una sola vez las webs repetidas", value=config.DEDUP_ENABLED,
+            help="Sucursales o filiales con la misma web: se scrapea, analiza y captura una vez y el resultado se copia a todas sus filas."
+        )
+        
+        evidence_workers = st.number_input(
+            "Capturas de evidencia en paralelo",
+            min_value=1, max_value=16, value=config.PIPELINE_EVIDENCE_WORKERS or config.POOL_SIZE,
+            help="Hilos de la etapa de evidencias del pipeline. Comparten los navegadores del pool con el scraping, así que no conviene pasar de su número."
+        )
+        
+        evidence_policy = st.selectbox(
+            "Política de evidencias",
+            options=config.EVIDENCE_POLICIES,
+            index=config.EVIDENCE_POLICIES.index(config.EVIDENCE_POLICY),
+            help="always: captura cada empresa · rejected-only: sólo rechazadas · deferred: todas al final. Las pendientes se pueden generar desde la tabla."
+        )
+        
+        st.subheader("🗄️ Cachés (scraping e IA)")
+        use_cache = st.checkbox(
+            "Usar caché local", value=True,
+            help=f"Reutiliza webs ya scrapeadas en las últimas {config.SCRAPE_CACHE_TTL_HOURS} h (misma URL normalizada)."
+        )
+        refresh_cache = st.checkbox(
+            "Forzar refresco", value=False, disabled=not use_cache,
+            help="Vuelve a scrapear todas las webs y actualiza la caché."
+        )
+        llm_cache = st.checkbox(
+            "Reutilizar respuestas de la IA", value=True,
+            help="Si la web, la descripción del cliente y el prompt no han cambiado, no se vuelve a llamar a Gemini."
+        )
+        
+        st.subheader("♻️ Reanudar")
+        unfinished_runs = RunJournal.list_runs()
+        resume = st.checkbox(
+            "Reanudar una ejecución interrumpida", value=False, disabled=not unfinished_runs,
+            help="Salta las filas que ya quedaron guardadas en el diario de esa ejecución (hay que subir el mismo Excel)."
+        )
+        resume_run_id = None
+        if resume and unfinished_runs:
+            resume_run_id = st.selectbox(
+                "Ejecución",
+                options=[run["run_id"] for run in unfinished_runs],
+                format_func=lambda run_id: next(
+                    f"{run['run_id']} ({run['rows']} filas terminadas)" for run in unfinished_runs if run["run_id"] == run_id
+                )
+            )
+        
         
     # --- PÁGINA PRINCIPAL ---
     st.title("🤖 Auditoría Automática de Precios de Transferencia")
@@ -100,9 +195,9 @@ def main():
         
         if uploaded_file:
             try:
-                df_preview = pd.read_excel(uploaded_file)
-                df = df_preview.dropna(subset=['Sitio web']) # O la columna clave que uses
-                st.success(f"✅ Archivo cargado: {len(df)} empresas.")
+                # Sólo se recorre la columna 'Sitio web' en streaming: no se carga el libro entero
+                _, companies = count_rows(uploaded_file)
+                st.success(f"✅ Archivo cargado: {companies} empresas.")
             except Exception as e:
                 st.error("❌ Error al leer el Excel.")
                 
@@ -126,7 +221,13 @@ def main():
             
             # --- INICIO DEL PROCESO ---
             try:
-                orchestrator = Orchestrator()
+                orchestrator = Orchestrator(
+                    pool_size=int(pool_size), max_per_host=int(max_per_host), llm_concurrency=int(llm_concurrency),
+                    llm_batch_size=int(llm_batch_size), llm_cascade=llm_cascade,
+                    use_cache=use_cache, refresh_cache=refresh_cache, preflight=preflight,
+                    evidence_policy=evidence_policy, evidence_workers=int(evidence_workers), llm_cache=llm_cache,
+                    resume_run_id=resume_run_id, dedup=dedup
+                )
             except Exception as e:
                 st.error(f"Error al iniciar el orquestador: {e}")
                 st.stop()
@@ -192,11 +293,16 @@ def main():
         col_kpi2.metric("Aceptadas (Comparables)", accepted, delta_color="normal")
         col_kpi3.metric("Rechazadas", rejected, delta_color="inverse")
         
+        # Métricas técnicas de la ejecución (niveles de scraping, etc.)
+        if result.get('summary'):
+            with st.expander("⚙️ Métricas de la ejecución"):
+                st.json(result['summary'])
+        
         # PESTAÑAS DE DETALLE
         tab1, tab2 = st.tabs(["📂 Tabla de Datos", "📈 Análisis Gráfico"])
         
         with tab1:
-            st.markdown("💡 *Las **filas completas** con Nivel de Confianza < 80% se resaltan en amarillo.*")
+            st.markdown(f"💡 *Las **filas completas** con Nivel de Confianza < {config.REVIEW_CONFIDENCE_THRESHOLD}% se resaltan en amarillo.*")
             
             # --- CORRECCIÓN CRÍTICA DE TIPOS (ARROW INVALID FIX) ---
             # 1. Creamos una copia para visualización
@@ -215,17 +321,38 @@ def main():
                     display_df[col] = display_df[col].astype(str).replace('nan', '')
 
             # 4. APLICAMOS EL ESTILO Y MOSTRAMOS
+            # (Selección de fila activada para poder pedir la evidencia bajo demanda)
             if 'Nivel de Confianza' in display_df.columns:
-                st.dataframe(
+                table_event = st.dataframe(
                     display_df.style.apply(highlight_row_low_confidence, axis=1)
                     .format({'Nivel de Confianza': '{:.0f}%'}),
                     hide_index=True,
-                    use_container_width=True
+                    use_container_width=True,
+                    key="results_table",
+                    on_select="rerun",
+                    selection_mode="single-row"
                 )
             else:
-                st.dataframe(display_df, hide_index=True, use_container_width=True)
+                table_event = st.dataframe(
+                    display_df, hide_index=True, use_container_width=True,
+                    key="results_table", on_select="rerun", selection_mode="single-row"
+                )
             # -------------------------------------------------------
             
+            # 5. EVIDENCIA BAJO DEMANDA (filas cuya captura quedó pendiente por la política elegida)
+            pending = result.get('pending_evidence') or {}
+            if pending:
+                st.caption(f"📸 {len(pending)} filas sin captura de evidencia. Selecciona una fila para generarla.")
+                selected_rows = table_event.selection.rows if table_event else []
+                col_ev1, col_ev2 = st.columns(2)
+                
+                if selected_rows and selected_rows[0] in pending:
+                    if col_ev1.button("📸 Generar evidencia de la fila seleccionada"):
+                        render_pending_evidence(result, [selected_rows[0]])
+                
+                if col_ev2.button(f"📸 Generar todas las pendientes ({len(pending)})"):
+                    render_pending_evidence(result, None)
+            
             st.markdown("---")          
             
             # BOTÓN DE DESCARGA
@@ -0,0 +1,247 @@
+"""
+Configuraciones globales y constantes del proyecto.
+Centralizamos aquí los "mandos" de rendimiento para no tener números mágicos
+repartidos entre el orquestador, el scraper y la UI.
+"""
+
+# --- POOL DE WORKERS (Playwright) ---
+# Número de procesos worker persistentes (cada uno con su propio Chromium).
+# Es también el límite global de páginas que se scrapean a la vez.
+POOL_SIZE = 2
+
+# Cortesía por dominio: máximo de peticiones simultáneas a un mismo host
+# y separación mínima (segundos) entre dos peticiones seguidas al mismo host.
+# Cuentan visitas de empresa, no peticiones HTTP: un hueco cubre la home y sus
+# DEEP_CRAWL_MAX_PAGES subpáginas, que se descargan a la vez sin esperar HOST_MIN_INTERVAL.
+# En el peor caso un host recibe MAX_PER_HOST * (1 + DEEP_CRAWL_MAX_PAGES) peticiones simultáneas.
+MAX_PER_HOST = 2
+HOST_MIN_INTERVAL = 1.0
+
+# Tiempo máximo (segundos) que esperamos la respuesta de un worker por trabajo.
+# Si se supera, el proceso se mata y se relanza en la siguiente petición.
+SCRAPE_JOB_TIMEOUT = 90
+SCREENSHOT_JOB_TIMEOUT = 120
+
+# --- SCRAPING ---
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Señales de "dominio en venta" / web aparcada (texto: se compilan en un único regex)
+JUNK_KEYWORDS = [
+    "domain for sale", "comprar este dominio", "parked free", "godaddy", 
+    "sedo", "hugedomains", "namecheap", "this domain is available", 
+    "buy this domain", "dominio a la venta", "site under construction",
+    "coming soon", "renew now"
+]
+
+# Hosts de aparcamiento/registradores: si la cadena de redirecciones pasa por aquí, es junk
+PARKING_HOSTS = [
+    "sedo.com", "sedoparking.com", "godaddy.com", "afternic.com", "dan.com", "hugedomains.com",
+    "bodis.com", "parkingcrew.net", "above.com", "namecheap.com", "parklogic.com", "undeveloped.com",
+    "buydomains.com", "domainmarket.com", "sav.com", "dynadot.com", "uniregistry.com", "epik.com",
+    "atom.com", "squadhelp.com", "domainnamesales.com", "parked.com", "dopa.com"
+]
+
+# Cabeceras HTTP típicas de páginas aparcadas (nombre -> fragmento del valor; "" = basta con que exista)
+PARKING_HEADERS = {"x-adblock-key": "", "server": "parking", "x-redirect-by": "parking"}
+
+# Un HTML 200 con menos bytes que esto (y sin scripts ni meta refresh) es una página vacía
+JUNK_MIN_CONTENT_LENGTH = 256
+
+# --- DEEP CRAWL (subpáginas "quiénes somos", "grupo", "aviso legal"...) ---
+# Peso de cada palabra clave al puntuar enlaces del mismo sitio (texto del enlace o URL)
+DEEP_LINK_KEYWORDS = {
+    "quienes somos": 6, "quiénes somos": 6, "sobre nosotros": 6, "about us": 6, "who we are": 6,
+    "nosotros": 4, "about": 4, "empresa": 3, "company": 3, "compañía": 3, "historia": 2, "history": 2,
+    "grupo": 5, "group": 5, "holding": 5, "filial": 5, "subsidiar": 5,
+    "aviso legal": 5, "legal notice": 5, "impressum": 5, "mentions légales": 5, "nota legal": 4,
+    "servicios": 3, "services": 3, "qué hacemos": 3, "what we do": 3, "actividad": 2
+}
+DEEP_CRAWL_MAX_PAGES = 3          # subpáginas por empresa (top K por puntuación; en paralelo, dentro del hueco de la home)
+DEEP_CRAWL_TIME_BUDGET = 20       # segundos por empresa para todas las subpáginas
+DEEP_MIN_SUBPAGE_CHARS = 100      # mínimo de texto para que una subpágina sirva de evidencia
+
+# --- PIPELINE (scraping -> IA -> lógica de negocio + evidencias) ---
+# Cada etapa tiene sus propios hilos y lee de una cola acotada: si una etapa se atasca,
+# la anterior se frena (backpressure) en vez de acumular trabajo en memoria.
+PIPELINE_QUEUE_SIZE = 16
+PIPELINE_SCRAPE_WORKERS = None     # None = POOL_SIZE
+PIPELINE_EVIDENCE_WORKERS = None   # None = POOL_SIZE
+PIPELINE_BATCH_LINGER = 2.0        # segundos que la etapa de IA espera a completar un lote
+
+# Diario de cada ejecución (una línea JSON por fila terminada) para poder reanudarla tras un corte
+JOURNAL_DIR = 'data/journal'
+JOURNAL_FSYNC_EVERY = 20       # fsync cada N filas...
+JOURNAL_FSYNC_SECONDS = 5.0    # ...o cada N segundos, lo que llegue antes
+
+# Salida de resultados: durante la ejecución las filas sólo se añaden (volcado .partial.jsonl y CSV);
+# el .xlsx se escribe al final, de una vez y en modo write-only. El CSV es el resultado parcial
+# legible durante la ejecución (y lo que queda si el proceso muere antes de escribir el .xlsx).
+RESULTS_SIDECAR = "csv"        # "csv" (se va ampliando durante la ejecución), "parquet" (al final, necesita pyarrow) o None
+
+# --- EXCEL DE ENTRADA ---
+# Se lee en streaming (openpyxl read-only) en bloques de INPUT_CHUNK_ROWS filas.
+# LÍMITE: la memoria es plana durante el procesamiento (bloque en curso + colas del pipeline), pero
+# al terminar se construye UNA VEZ el dataframe completo de resultados para la tabla de Streamlit y
+# las evidencias bajo demanda: el pico final crece con el número de filas (y columnas de paso).
+# Para Excel muy grandes conviene acotar INPUT_PASSTHROUGH_COLUMNS.
+INPUT_CHUNK_ROWS = 500
+INPUT_REQUIRED_COLUMNS = ['Sitio web']
+# Nombre de la empresa (etiquetas de progreso y comentarios de webs repetidas): se lee siempre que
+# exista, aunque no esté en INPUT_PASSTHROUGH_COLUMNS
+INPUT_NAME_COLUMN = 'Nombre empresaAlfabeto latino'
+# Columnas que pasan tal cual a la salida. None = todas; con una lista (p.ej. los identificadores
+# de Orbis/SABI) sólo se leen esas, lo que aligera mucho las exportaciones anchas
+INPUT_PASSTHROUGH_COLUMNS = None
+
+# Webs repetidas en el Excel (sucursales, filiales que apuntan a la web del grupo): scraping, IA y
+# evidencia una sola vez por web y el resultado se copia a todas sus filas
+DEDUP_ENABLED = True
+DEDUP_KEY = "url"              # "url": host + ruta normalizados (utils.helpers.normalize_url) | "host": sólo el dominio
+
+# --- FAST PATH ESTÁTICO (HTTP plano antes de Chromium) ---
+STATIC_FETCH_ENABLED = True
+STATIC_TIMEOUT = 10             # segundos por petición
+STATIC_MAX_BYTES = 2_000_000    # no descargamos más de 2 MB de HTML
+STATIC_MIN_TEXT_CHARS = 400     # por debajo, escalamos a Playwright
+
+# --- EVIDENCIAS ---
+# "always":        captura para cada empresa analizada (comportamiento original)
+# "rejected-only": sólo para las rechazadas; las aceptadas se pueden generar desde la tabla
+# "deferred":      ninguna durante la pasada principal; se generan todas al final
+EVIDENCE_POLICIES = ["always", "rejected-only", "deferred"]
+EVIDENCE_POLICY = "always"
+
+# Almacén de capturas (nombre = hash del contenido, índice en evidence/index.jsonl)
+EVIDENCE_DIR = 'evidence'
+EVIDENCE_CAPTURE = "viewport"     # "viewport": 1920x1080 centrado en el resaltado | "full": página completa
+EVIDENCE_FORMAT = "jpeg"          # "png", "jpeg" o "webp" (webp necesita Pillow; si no, jpeg)
+EVIDENCE_QUALITY = 70             # 1-100, para jpeg/webp
+
+# Instantánea MHTML de la página de evidencia tomada durante el scraping (CDP Page.captureSnapshot).
+# La captura se renderiza después sin red sobre esa copia: muestra exactamente lo que leyó el LLM.
+# Sólo se guarda si SCRAPE_RESOURCE_PROFILE no bloquea recursos visuales (imágenes, fuentes, vídeo):
+# con el perfil "text" por defecto no hay instantánea y la evidencia se renderiza en vivo con
+# SCREENSHOT_RESOURCE_PROFILE, igual que las filas del nivel estático (que nunca la tienen).
+SNAPSHOT_ENABLED = True
+SNAPSHOT_DIR = 'evidence/snapshots'   # se podan con SCRAPE_CACHE_TTL_HOURS
+SNAPSHOT_MAX_BYTES = 15_000_000   # instantáneas mayores no se guardan
+
+# --- LLM (Gemini) ---
+# Por debajo de esta confianza la fila se marca para revisión humana (tabla de la app)
+# y, en modo cascada, se repite con el modelo fuerte
+REVIEW_CONFIDENCE_THRESHOLD = 80
+
+# Modelos a probar en orden de preferencia
+LLM_MODELS = [
+    'gemini-2.5-flash',
+    'gemini-2.5-flash-lite',
+    'gemini-2.0-flash',
+    'gemini-2.0-flash-001',
+    'gemini-2.0-flash-lite-001',
+    'gemini-2.0-flash-lite',
+]
+
+# Llamadas simultáneas al LLM (hilos de la etapa de IA del pipeline)
+LLM_CONCURRENCY = 4
+
+# Límites por modelo: peticiones/min (rpm) y tokens/min (tpm). Ajustar a la cuota de la API key.
+LLM_RATE_LIMITS = {
+    'gemini-2.5-flash':          {"rpm": 10, "tpm": 250_000},
+    'gemini-2.5-flash-lite':     {"rpm": 15, "tpm": 250_000},
+    'gemini-2.0-flash':          {"rpm": 15, "tpm": 1_000_000},
+    'gemini-2.0-flash-001':      {"rpm": 15, "tpm": 1_000_000},
+    'gemini-2.0-flash-lite-001': {"rpm": 30, "tpm": 1_000_000},
+    'gemini-2.0-flash-lite':     {"rpm": 30, "tpm": 1_000_000},
+}
+LLM_DEFAULT_RATE_LIMIT = {"rpm": 10, "tpm": 250_000}
+LLM_OUTPUT_TOKENS_ESTIMATE = 400   # tokens de respuesta que reservamos por llamada
+
+# Reintentos ante 429 (cuota): backoff exponencial con jitter antes de cambiar de modelo
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_BASE = 2.0    # segundos (se duplica en cada intento)
+LLM_BACKOFF_MAX = 30.0
+
+# Pre-clasificación por reglas (filial/grupo/fábrica explícitos): la fila no llega al LLM
+PRECLASSIFIER_ENABLED = True
+PRECLASSIFIER_MIN_CONFIDENCE = 90   # las reglas por debajo de este nivel no deciden solas
+
+# Circuit breaker de modelos: cooldown (s) tras un 404 y tras LLM_QUOTA_STRIKES fallos de cuota seguidos
+LLM_NOT_FOUND_COOLDOWN = 3600
+LLM_QUOTA_STRIKES = 2
+LLM_QUOTA_COOLDOWN = 60
+# Orden por latencia: media exponencial (peso de la última llamada) y tramos de segundos a igualar
+LLM_LATENCY_ALPHA = 0.3
+LLM_LATENCY_BUCKET = 2.0
+
+# Contexto que llega al prompt: pasajes más relevantes (BM25) hasta LLM_CONTEXT_CHARS, en orden original
+LLM_CONTEXT_CHARS = 6000
+CONTEXT_PASSAGE_CHARS = 400
+# Señales de decisión (prefijos, sin tildes al comparar) y su peso; las palabras del cliente pesan CONTEXT_CLIENT_WEIGHT
+CONTEXT_SIGNAL_TERMS = {
+    "grupo": 3, "group": 3, "holding": 3, "filial": 3, "subsidiar": 3, "matriz": 2, "headquarter": 2,
+    "particip": 1, "parent": 2, "member": 1, "miembro": 1,
+    "fabric": 3, "manufactur": 3, "produc": 2, "planta": 2, "plant": 2, "factory": 3, "industrial": 2,
+    "quienes": 2, "about": 1, "nosotros": 1, "empresa": 1, "company": 1,
+    "servicio": 2, "service": 2, "actividad": 1, "distribu": 2, "consultor": 1
+}
+CONTEXT_CLIENT_WEIGHT = 1.0
+
+# Cascada: primero un modelo barato con contexto reducido; las filas con confianza
+# < REVIEW_CONFIDENCE_THRESHOLD se repiten con modelos fuertes y más contexto
+LLM_CASCADE_ENABLED = False
+LLM_CASCADE_FAST_MODELS = ['gemini-2.0-flash-lite', 'gemini-2.0-flash-lite-001', 'gemini-2.5-flash-lite']
+LLM_CASCADE_FAST_CONTEXT_CHARS = 3000
+LLM_CASCADE_STRONG_MODELS = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.0-flash-001']
+LLM_CASCADE_STRONG_CONTEXT_CHARS = 12000
+
+# Modo lote: empresas por petición (1 = desactivado) y tope de tokens de entrada por petición
+LLM_BATCH_SIZE = 1
+LLM_BATCH_TOKEN_BUDGET = 40_000
+
+# Caché de respuestas del LLM (SQLite local). La clave incluye la versión del prompt.
+LLM_CACHE_PATH = 'data/cache/llm_cache.sqlite'
+LLM_CACHE_TTL_HOURS = 24 * 30       # 0/None = sin caducidad
+LLM_CACHE_MAX_ENTRIES = 50000       # tope con expulsión LRU
+
+# --- PERFILES DE BLOQUEO DE RECURSOS (route interception en Playwright) ---
+# "text": para extraer texto no necesitamos imágenes, fuentes, vídeo ni analítica.
+# "full": fidelidad completa, pensado para las capturas de evidencia.
+RESOURCE_PROFILES = {
+    "text": {"block_types": ["image", "media", "font"], "block_trackers": True},
+    "full": {"block_types": [], "block_trackers": False},
+}
+SCRAPE_RESOURCE_PROFILE = "text"
+SCREENSHOT_RESOURCE_PROFILE = "full"
+
+# Hosts de publicidad/analítica (se bloquea también cualquier subdominio)
+TRACKER_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "googleadservices.com",
+    "doubleclick.net", "googlesyndication.com", "facebook.net", "connect.facebook.net",
+    "hotjar.com", "clarity.ms", "segment.io", "mixpanel.com",
+    "hs-analytics.net", "hs-scripts.com", "px.ads.linkedin.com", "snap.licdn.com", "ads-twitter.com",
+    "analytics.tiktok.com", "criteo.com", "taboola.com", "outbrain.com", "mc.yandex.ru", "matomo.cloud"
+]
+
+# Tamaño medio estimado (bytes) de cada recurso bloqueado, para el contador de ahorro
+BLOCKED_BYTES_ESTIMATE = {"image": 60_000, "media": 400_000, "font": 35_000, "tracker": 40_000}
+
+# --- DETECCIÓN DE "PÁGINA LISTA" (sustituye a los wait_for_timeout fijos) ---
+# strategy: "adaptive" -> vuelve en cuanto el texto del DOM deja de cambiar durante quiet_ms
+#           "fixed"    -> espera siempre max_ms (comportamiento antiguo, útil para comparar)
+# min_chars: no damos la página por lista mientras el body tenga menos texto que esto
+READINESS = {
+    "scrape":     {"strategy": "adaptive", "quiet_ms": 300, "max_ms": 1500, "min_chars": 50, "poll_ms": 100},
+    "deep":       {"strategy": "adaptive", "quiet_ms": 400, "max_ms": 2000, "min_chars": 50, "poll_ms": 100},
+    "screenshot": {"strategy": "adaptive", "quiet_ms": 500, "max_ms": 2000, "min_chars": 0, "poll_ms": 100},
+}
+
+# --- CACHÉ DE SCRAPING (SQLite local) ---
+SCRAPE_CACHE_PATH = 'data/cache/scrape_cache.sqlite'
+SCRAPE_CACHE_TTL_HOURS = 72         # 0/None = sin caducidad
+SCRAPE_CACHE_MAX_ENTRIES = 20000    # tope con expulsión LRU
+
+# --- PRE-CHEQUEO DNS/TCP (descarta dominios muertos antes de abrir navegador) ---
+PREFLIGHT_ENABLED = True
+PREFLIGHT_WORKERS = 32       # hilos para resolver/probar hosts en paralelo
+PREFLIGHT_TIMEOUT = 3        # segundos por intento de conexión TCP
+PREFLIGHT_PORTS = (443, 80)
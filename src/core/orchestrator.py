@@ -1,22 +1,54 @@
-import pandas as pd
 import time
 import os
 import sys
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Importamos los módulos reales
 from modules.scraper import Scraper
 from modules.llm_engine import LLMEngine
+from modules.politeness import interleave_by_host, host_of
+from modules.preflight import preflight_hosts, probe_target
+from modules.pre_classifier import PreClassifier
+from modules.run_journal import RunJournal, row_fingerprint
+from modules.result_sink import ResultSink, write_xlsx
+from modules.excel_reader import iter_chunks, iter_column, output_columns
+from utils.helpers import normalize_url
+from core import config
+from core.pipeline import Pipeline, Stage
 
 class Orchestrator:
     
-    def __init__(self):
+    def __init__(self, pool_size=None, max_per_host=None, use_cache=True, refresh_cache=False, preflight=None,
+                 evidence_policy=None, llm_concurrency=None, llm_cache=True, llm_batch_size=None,
+                 llm_cascade=None, scrape_workers=None, evidence_workers=None, resume_run_id=None, dedup=None):
         self.input_path = 'data/input/Matriz AR en blanco.xlsx'
         self.output_folder = 'data/output'
         
         # Instanciamos los agentes
-        self.scraper = Scraper()
-        self.llm = LLMEngine()
+        self.scraper = Scraper(
+            pool_size=pool_size, max_per_host=max_per_host,
+            use_cache=use_cache, refresh_cache=refresh_cache
+        )
+        self.llm = LLMEngine(
+            concurrency=llm_concurrency, use_cache=llm_cache, batch_size=llm_batch_size, cascade=llm_cascade
+        )
+        # Reglas deterministas: los casos obvios (filial, grupo, fábrica) no llegan a la IA
+        self.pre_classifier = PreClassifier() if config.PRECLASSIFIER_ENABLED else None
+        self.preflight = config.PREFLIGHT_ENABLED if preflight is None else preflight
+        # Webs repetidas en el Excel (sucursales, filiales con la web del grupo): se analizan una vez
+        self.dedup = config.DEDUP_ENABLED if dedup is None else dedup
+        
+        # Hilos de las etapas de scraping y de evidencias del pipeline (la de IA usa llm_concurrency)
+        self.scrape_workers = scrape_workers or config.PIPELINE_SCRAPE_WORKERS or self.scraper.pool.size
+        self.evidence_workers = evidence_workers or config.PIPELINE_EVIDENCE_WORKERS or self.scraper.pool.size
+        
+        # Política de evidencias: "always", "rejected-only" o "deferred" (ver config.EVIDENCE_POLICIES)
+        self.evidence_policy = evidence_policy or config.EVIDENCE_POLICY
+        self.pending_evidence = {} # {índice de fila: {"url", "quote", "snapshot"}} capturas aún no generadas
+        self.run_id = None         # identifica la ejecución en el índice de evidencias
+        # Reanudar: se reutiliza el run_id y se saltan las filas que ya están en su diario
+        self.resume_run_id = resume_run_id
         
         # Aseguramos que existan carpetas de salida
         os.makedirs(self.output_folder, exist_ok=True)
@@ -27,133 +59,474 @@ class Orchestrator:
         Función principal que coordina todo el flujo.
         """
         
-        # 1. Cargar los datos
+        # 1. Cargar los datos: lectura en streaming (openpyxl read-only), por bloques de
+        # INPUT_CHUNK_ROWS filas. Aquí sólo leemos la cabecera y planificamos sobre la columna 'Sitio web'.
         print("📂 Cargando Excel...")
+        source = upload_file_obj or self.input_path
         
         try:
-            if upload_file_obj:
-                df = pd.read_excel(upload_file_obj)
-            else: 
-                df = pd.read_excel(self.input_path)
+            original_len, total_rows, shared, dedup_stats = self._plan_groups(source)
+            input_columns = output_columns(source)
         except Exception as e:
             return {"status": "error", "message": f"Error leyendo Excel: {str(e)}"}            
         
-        # --- LIMPIEZA Y RE-INDEXACIÓN ---
-        original_len = len(df)
+        # Las filas sin 'Sitio web' se descartan al leer, pero mantenemos los "0"
+        print(f"🧹 Limpieza: {original_len} -> {total_rows} filas (Se mantuvieron valores '0')")
         
-        # Quitamos vacíos reales, pero mantenemos los "0"
-        df = df.dropna(subset=['Sitio web'])
+        # Asegurar columnas de salida (las originales primero, en su orden)
+        new_cols = ['Falta de información', 'Distintas funciones', 'Distinto servicio', 
+                    'Grupo', 'A/R', 'Comentario', 'Link Evidencia', 'Nivel de Confianza', 'Fuente Veredicto']
+        columns = input_columns + [col for col in new_cols if col not in input_columns]
+                
+        print(f"🚀 Iniciando procesamiento de {total_rows} empresas...")
         
-        # VITAL: Reenumerar las filas (0, 1, 2...) para evitar el error del 101% en la barra de progreso
-        df = df.reset_index(drop=True)
+        self.pending_evidence = {}
+        self.run_id = self.resume_run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        total_rows = len(df)
-        print(f"🧹 Limpieza: {original_len} -> {total_rows} filas (Se mantuvieron valores '0')")
+        # Salida incremental: cada fila terminada se añade al volcado .partial.jsonl (y al CSV, si está activo);
+        # el Excel se escribe una vez al final
+        output_filename = f"Matriz_Trabajada_{self.run_id}.xlsx"
+        output_path = os.path.join(self.output_folder, output_filename)
+        sink = ResultSink(output_path, columns)
         
-        results_df = df.copy()
-        results_df = results_df.astype(object) 
+        # Diario de la ejecución: cada fila terminada se guarda en disco al momento
+        journal = RunJournal(self.run_id)
+        journaled = journal.load() if self.resume_run_id else {}
+        if journaled:
+            print(f"♻️ Reanudando la ejecución {self.run_id}: {len(journaled)} filas ya terminadas en el diario")
         
-        # Asegurar columnas de salida
-        new_cols = ['Falta de información', 'Distintas funciones', 'Distinto servicio', 
-                    'Grupo', 'A/R', 'Comentario', 'Link Evidencia', 'Nivel de Confianza']
+        counters = {"resumed_rows": 0, "chunks": 0}
+        preflight_stats = {"hosts": 0, "dead_dns": 0, "dead_tcp": 0, "rows_skipped": 0} if self.preflight else None
         
-        for col in new_cols:
-            if col not in results_df.columns:
-                results_df[col] = ''
-                
-        print(f"🚀 Iniciando procesamiento de {total_rows} empresas...")
+        # 2. El Excel entra al pipeline bloque a bloque (triaje y pre-chequeo incluidos, en el hilo
+        # alimentador): con las colas acotadas, en memoria sólo hay unos pocos bloques a la vez.
+        feed = self._feed_items(source, journaled, counters, preflight_stats, shared)
+        group_results = {} # {clave de web: resultado de su primera fila} mientras queden filas que lo compartan
         
-        # 2. Bucle principal con enumerate para control exacto de la barra de progreso
-        for i, (index, row) in enumerate(results_df.iterrows()):
-                        
-            # Actualizar UI (i + 1 siempre llegará al 100% exacto del total de filas)
-            current_company = row.get("Nombre empresaAlfabeto latino", "Desconocida")
-            if progress_callback:
-                progress_callback(i + 1, total_rows, f'Analizando: {current_company}') 
+        # 3. Pipeline scraping -> IA -> lógica de negocio + evidencia. Cada etapa tiene sus propios
+        # hilos y una cola acotada de entrada: la IA trabaja mientras se sigue scrapeando y las
+        # capturas no frenan a ninguna de las dos. Los resultados salen en el orden del Excel y se
+        # escriben desde el hilo principal (la barra de progreso de Streamlit sólo se toca desde aquí).
+        pipeline = Pipeline([
+            Stage("scrape", self._scrape_stage, workers=self.scrape_workers),
+            Stage(
+                "llm", lambda batch: self._llm_stage(batch, client_description),
+                workers=self.llm.dispatcher.concurrency, batch_size=self.llm.batch_size,
+                linger=config.PIPELINE_BATCH_LINGER
+            ),
+            Stage("evidence", self._evidence_stage, workers=self.evidence_workers)
+        ], queue_size=config.PIPELINE_QUEUE_SIZE)
+        
+        try:
+            for item in pipeline.run(feed):
+                index = item["index"]
+                group = item.get("group")
+                if item.get("follower"):
+                    # Misma web que una fila anterior (que ya salió: el pipeline entrega en orden)
+                    self._fan_out(item, group_results[group])
                 
-            raw_url = str(row.get('Sitio web', '')).strip()
-            
-            # --- TRATAMIENTO DEL VALOR "0" ---
-            if raw_url == "0" or not raw_url:
-                results_df.at[index, 'A/R'] = 'R'
-                results_df.at[index, 'Comentario'] = "Rechazado: Valor de sitio web no válido (0)."
-                results_df.at[index, 'Falta de información'] = 'SI (Rechazado)'
-                results_df.at[index, 'Nivel de Confianza'] = 100
-                continue
+                if item.get("error"):
+                    print(f"⚠️ Error procesando la fila {index}: {item['error']}")
+                    item["values"] = {'Comentario': f"Error interno ({item['error']}). Revisar manualmente."}
+                    item["label"] = f'Error: {item["raw_url"]}'
+                elif not item.get("resumed"):
+                    # Las filas con error no se anotan: al reanudar se vuelven a intentar
+                    journal.append(item["fingerprint"], index, item["values"], item.get("evidence_job"))
+                
+                sink.write({**item.pop("row"), **item["values"]})
+                if group:
+                    if not item.get("follower"):
+                        group_results[group] = {
+                            "values": item["values"], "error": item.get("error"),
+                            "evidence_job": item.get("evidence_job"), "evidence_shot": item.get("evidence_shot"),
+                            "name": item["name"]
+                        }
+                    shared[group] -= 1
+                    if shared[group] <= 0:
+                        group_results.pop(group, None)
+                if item.get("evidence_job"):
+                    self.pending_evidence[index] = item["evidence_job"]
+                
+                if progress_callback:
+                    label = item.get("label") or f'Analizando: {item["name"]}'
+                    progress_callback(pipeline.completed, total_rows, label)
+        finally:
+            journal.close()
+        
+        # 3b. Evidencias diferidas: se generan todas juntas tras la pasada principal
+        if self.evidence_policy == "deferred" and self.pending_evidence:
+            print(f"📸 Generando {len(self.pending_evidence)} evidencias diferidas...")
+            links = self._render_evidence_batch(list(self.pending_evidence), progress_callback)
+            for index, link in links.items():
+                sink.update(index, {'Link Evidencia': link})
+        
+        # Un único dataframe (para la UI), construido de una vez con todas las filas. Es el pico de
+        # memoria de la ejecución y crece con el Excel (límite documentado en config, INPUT_CHUNK_ROWS)
+        results_df = sink.dataframe()
+        
+        # Liberamos los navegadores del pool en cuanto acaba el bucle
+        self.scraper.close()
+        
+        summary = {
+            "preflight": preflight_stats,
+            "scraping": self.scraper.get_stats(),
+            "preclassifier": self.pre_classifier.get_stats() if self.pre_classifier else None,
+            "llm": self.llm.get_stats(),
+            "pipeline": pipeline.get_stats(),
+            "journal": {"run_id": self.run_id, "path": journal.path, "resumed_rows": counters["resumed_rows"]},
+            "input": {"rows": total_rows, "chunks": counters["chunks"], "chunk_size": config.INPUT_CHUNK_ROWS},
+            "dedup": dedup_stats,
+            "evidence": {"policy": self.evidence_policy, "pending": len(self.pending_evidence)}
+        }
+        
+        # 4. Guardar resultados (Excel final en modo write-only + sidecar, si está activado)
+        summary["output"] = sink.close(results_df)
+        journal.finish(output_path)
+        print(f"📊 Resumen: {summary}")
+        print(f"✅ Proceso terminado. Archivo guardado en: {output_path}")
+        
+        return {
+            "status": "success", "file_path": output_path, "dataframe": results_df, "summary": summary,
+            "pending_evidence": dict(self.pending_evidence), "run_id": self.run_id
+        }
 
-            # --- Paso A: Scrapping (Texto) ---------
-            web_data = self.scraper.extract_text(raw_url)
-            
-            # Si la web es basura o inaccesible, paramos aquí
-            if web_data['is_junk'] or web_data['status'] != 200:
-                results_df.at[index, 'A/R'] = 'R'
-                results_df.at[index, 'Comentario'] = f"Error/Junk: {web_data.get('error_msg', 'Web inaccesible')}"
-                results_df.at[index, 'Falta de información'] = 'SI (Rechazado)'
+    def _group_key(self, raw_url):
+        """Clave de agrupación de una web ('0' y vacías no se agrupan): URL normalizada o sólo el host."""
+        raw_url = str(raw_url or '').strip()
+        if raw_url == "0" or not raw_url:
+            return None
+        if config.DEDUP_KEY == "host":
+            return host_of(raw_url) or None
+        return normalize_url(raw_url) or None
+
+    def _plan_groups(self, source):
+        """
+        Pasada de planificación sobre la columna 'Sitio web' (sin leer el resto de la fila).
+        Devuelve (filas, filas con web, {clave: nº de filas} de las webs repetidas, estadísticas).
+        """
+        original_len = total_rows = 0
+        sizes = {}
+        for value in iter_column(source, 'Sitio web'):
+            original_len += 1
+            if value is None:
                 continue
-            
-            # --- Paso B: INTELIGENCIA ARTIFICIAL ---------
-            analysis = self.llm.analyze(web_data['text_content'], client_description)
-                        
-            # --- Paso C: EVIDENCIA (Screenshot + Highlight Láser) ---------
-            quote_to_find = analysis.get('evidence_quote', '')
-            target_url_for_screenshot = web_data.get('url_evidencia', raw_url)
-            
-            # El scraper llamará al worker con la lógica de resaltado de tus compañeros
-            screenshot_path = self.scraper.take_screenshot(target_url_for_screenshot, quote_to_find)
-            
-            # --- Paso D: LÓGICA DE NEGOCIO ---------
-            decision = 'A'
-            reason = analysis.get('reasoning', 'Sin razonamiento')
-            confidence = analysis.get('confidence_score', 0)
-            
-            results_df.at[index, 'Nivel de Confianza'] = confidence
-            
-            # Regla 1: Grupos fuera
-            if analysis.get('is_group'):
-                decision = 'R'
-                results_df.at[index, 'Grupo'] = 'SI (Rechazado)' 
-            else:
-                results_df.at[index, 'Grupo'] = 'NO'
+            total_rows += 1
+            key = self._group_key(value) if self.dedup else None
+            if key:
+                sizes[key] = sizes.get(key, 0) + 1
+        
+        shared = {key: size for key, size in sizes.items() if size > 1}
+        rows_with_site = sum(sizes.values())
+        stats = {
+            "enabled": self.dedup,
+            "key": config.DEDUP_KEY,
+            "rows_with_site": rows_with_site,
+            "unique_sites": len(sizes),
+            "shared_sites": len(shared),
+            "rows_fanned_out": rows_with_site - len(sizes),
+            # Filas por web analizada: 1.0 = sin repeticiones
+            "collapse_ratio": round(rows_with_site / len(sizes), 3) if sizes else 1.0
+        }
+        if shared:
+            print(f"🔗 {len(shared)} webs repetidas: {stats['rows_fanned_out']} filas reutilizarán el análisis de otra")
+        return original_len, total_rows, shared, stats
+
+    def _fan_out(self, item, leader):
+        """Copia en una fila el resultado de la primera fila con su misma web."""
+        item["values"] = dict(leader["values"])
+        if item["values"].get('Comentario'):
+            item["values"]['Comentario'] = f"{item['values']['Comentario']} [Misma web que: {leader['name']}]"
+        if leader.get("evidence_job"):
+            item["evidence_job"] = leader["evidence_job"]
+        if leader.get("evidence_shot"):
+            # Captura ya hecha para la primera fila: se anota también esta en el índice de evidencias
+            shot = leader["evidence_shot"]
+            try:
+                self.scraper.evidence_store.link(shot["path"], run_id=self.run_id, row=item["index"], url=shot["url"])
+            except OSError as e:
+                print(f"⚠️ No se pudo anotar la evidencia de la fila {item['index']}: {e}")
+        if leader.get("error"):
+            item["error"] = leader["error"]
+        item["label"] = f'Web compartida con {leader["name"]}: {item["raw_url"]}'
+
+    def _feed_items(self, source, journaled, counters, preflight_stats, shared):
+        """
+        Generador de items del pipeline, bloque a bloque del Excel. Cada fila es un item;
+        las que se resuelven aquí (diario, sin web, dominio muerto, web repetida) van marcadas como done.
+        """
+        dead_reasons = {
+            "dns": "Rechazado: el dominio no resuelve (DNS).",
+            "tcp": "Rechazado: el servidor no responde (sin conexión TCP en 443/80)."
+        }
+        probes = {}  # resultados del pre-chequeo de todos los bloques (cada host se prueba una vez)
+        leaders = set()  # webs repetidas cuya primera fila ya ha entrado al pipeline
+        preflight = self.preflight
+        seq = 0
+        
+        for chunk in iter_chunks(source):
+            counters["chunks"] += 1
+            items = []
+            for row in chunk:
+                raw_url = str(row.get('Sitio web', '')).strip()
+                item = {
+                    "seq": seq, "index": seq, "raw_url": raw_url, "values": {}, "done": False,
+                    "row": row, "fingerprint": row_fingerprint(row),
+                    "name": row.get(config.INPUT_NAME_COLUMN) or "Desconocida"
+                }
+                items.append(item)
+                seq += 1
                 
-            # Regla 2: Manufactura fuera
-            if analysis.get('is_manufacturer'):
-                decision = "R"
-                results_df.at[index, 'Distintas funciones'] = "SI (Rechazado)"
-            else:
-                results_df.at[index, 'Distintas funciones'] = "NO"
+                # Web repetida: la primera fila se procesa; el resto espera su resultado (fan-out)
+                key = self._group_key(raw_url) if shared else None
+                if key in shared:
+                    item["group"] = key
+                    is_follower = key in leaders
+                    leaders.add(key)
+                else:
+                    is_follower = False
                 
-            # 3. Distinto servicio
-            if not analysis.get('service_match', True): 
-                decision = 'R'
-                results_df.at[index, 'Distinto servicio'] = 'SI (Rechazado)'
-            else:
-                results_df.at[index, 'Distinto servicio'] = 'NO'
+                # --- FILA YA TERMINADA EN UNA EJECUCIÓN ANTERIOR ---
+                entry = journaled.get(item["fingerprint"])
+                if entry:
+                    item["values"] = entry.get("values") or {}
+                    item["evidence_job"] = entry.get("evidence_job")
+                    item["done"] = True
+                    item["resumed"] = True
+                    item["label"] = f'Recuperada del diario: {raw_url}'
+                    counters["resumed_rows"] += 1
+                    continue
+                
+                if is_follower:
+                    item["follower"] = True
+                    item["done"] = True
+                    continue
+                
+                # --- TRATAMIENTO DEL VALOR "0" ---
+                if raw_url == "0" or not raw_url:
+                    item["values"] = {
+                        'A/R': 'R',
+                        'Comentario': "Rechazado: Valor de sitio web no válido (0).",
+                        'Falta de información': 'SI (Rechazado)',
+                        'Nivel de Confianza': 100
+                    }
+                    item["done"] = True
+                    item["label"] = f'Sin web: {item["name"]}'
             
-            # 4. Falta de información
-            if confidence < 30:
-                decision = 'R'
-                results_df.at[index, 'Falta de información'] = 'SI (Rechazado)'
-                reason = "Información insuficiente o web no operativa."
-            else:
-                results_df.at[index, 'Falta de información'] = 'NO'
+            # Pre-chequeo DNS/TCP: los dominios muertos no llegan a abrir navegador
+            pending = [item for item in items if not item["done"]]
+            if preflight and pending:
+                targets = {probe_target(item["raw_url"]) for item in pending} - set(probes)
+                if targets:
+                    print(f"📡 Pre-chequeo DNS/TCP de {len(targets)} dominios...")
+                    new_probes = preflight_hosts(targets)
+                    if not new_probes:
+                        # Proxy o red restringida: no se puede confiar en la prueba para el resto del Excel
+                        preflight = False
+                    preflight_stats["hosts"] += len(new_probes)
+                    for probe in new_probes.values():
+                        if not probe["alive"]:
+                            preflight_stats[f"dead_{probe['reason']}"] += 1
+                    probes.update(new_probes)
                 
-            results_df.at[index, 'A/R'] = decision
-            results_df.at[index, 'Comentario'] = f"{reason} (Confianza: {confidence}%)"
+                for item in pending:
+                    probe = probes.get(probe_target(item["raw_url"]))
+                    if not probe or probe["alive"]:
+                        continue
+                    
+                    item["values"] = {
+                        'A/R': 'R',
+                        'Comentario': dead_reasons[probe["reason"]],
+                        'Falta de información': 'SI (Rechazado)',
+                        'Nivel de Confianza': 100
+                    }
+                    item["done"] = True
+                    item["label"] = f'Dominio muerto: {item["raw_url"]}'
+                    preflight_stats["rows_skipped"] += 1
+            
+            # Primero las ya resueltas (no cuestan nada); el resto intercaladas por dominio (cortesía).
+            # La salida del pipeline se reordena por "seq", es decir, por el orden del Excel.
+            for item in items:
+                if item["done"]:
+                    yield item
+            for item in interleave_by_host([item for item in items if not item["done"]], key=lambda item: item["raw_url"]):
+                yield item
+
+    def _scrape_stage(self, item):
+        """Etapa 1: scraping, descarte de webs inservibles y pre-clasificación por reglas."""
+        web_data = self.scraper.extract_text(item["raw_url"])
+        item["web_data"] = web_data
+        
+        # Si la web es basura o inaccesible, se rechaza la fila sin pasar por la IA
+        if web_data['is_junk'] or web_data['status'] != 200:
+            item["values"] = {
+                'A/R': 'R',
+                'Comentario': f"Error/Junk: {web_data.get('error_msg', 'Web inaccesible')}",
+                'Falta de información': 'SI (Rechazado)'
+            }
+            item["done"] = True
+            item["label"] = f'Descartada: {item["raw_url"]}'
+            return
+        
+        verdict = self._pre_classify(web_data)
+        if verdict is not None:
+            # Caso obvio resuelto por reglas: sin llamada al LLM
+            item["analysis"] = verdict
+            item["source"] = 'Reglas'
+            item["label"] = f'Resuelta por reglas: {item["raw_url"]}'
+
+    def _llm_stage(self, batch, client_description):
+        """Etapa 2: clasificación con la IA (un lote de hasta llm.batch_size filas por llamada)."""
+        if isinstance(batch, dict):
+            batch = [batch]
+        todo = [item for item in batch if "analysis" not in item]
+        if not todo:
+            return
+        analyses = self.llm.classify_rows(
+            [(item["index"], item["web_data"]['text_content']) for item in todo], client_description
+        )
+        for item in todo:
+            item["analysis"], item["source"] = analyses[item["index"]]
+
+    def _pre_classify(self, web_data):
+        """Veredicto por reglas (mismo esquema que el LLM) o None si hay que preguntar a la IA."""
+        if not self.pre_classifier:
+            return None
+        return self.pre_classifier.classify(web_data['text_content'])
+
+    def _evidence_stage(self, item):
+        """
+        Etapa 3 (pasos C-D) para una fila ya analizada: lógica de negocio y evidencia.
+        Deja en item["values"] las columnas a escribir y, si la captura se aplaza, item["evidence_job"].
+        """
+        analysis = item["analysis"]
+        web_data = item["web_data"]
+        values = {'Fuente Veredicto': item["source"]}
+        
+        # --- Paso C: LÓGICA DE NEGOCIO ---------
+        decision = 'A'
+        reason = analysis.get('reasoning', 'Sin razonamiento')
+        confidence = analysis.get('confidence_score', 0)
+        
+        values['Nivel de Confianza'] = confidence
+        # Veredicto por reglas: los criterios que no se han evaluado no se dan por buenos
+        not_assessed = set(analysis.get('not_assessed') or ())
+        
+        # Regla 1: Grupos fuera
+        if analysis.get('is_group'):
+            decision = 'R'
+            values['Grupo'] = 'SI (Rechazado)' 
+        else:
+            values['Grupo'] = 'No evaluado' if 'is_group' in not_assessed else 'NO'
+            
+        # Regla 2: Manufactura fuera
+        if analysis.get('is_manufacturer'):
+            decision = "R"
+            values['Distintas funciones'] = "SI (Rechazado)"
+        else:
+            values['Distintas funciones'] = 'No evaluado' if 'is_manufacturer' in not_assessed else "NO"
+            
+        # 3. Distinto servicio
+        if not analysis.get('service_match', True): 
+            decision = 'R'
+            values['Distinto servicio'] = 'SI (Rechazado)'
+        else:
+            values['Distinto servicio'] = 'No evaluado' if 'service_match' in not_assessed else 'NO'
+        
+        # 4. Falta de información
+        if confidence < 30:
+            decision = 'R'
+            values['Falta de información'] = 'SI (Rechazado)'
+            reason = "Información insuficiente o web no operativa."
+        else:
+            values['Falta de información'] = 'NO'
             
-            # Hyperlink local para el Excel
+        values['A/R'] = decision
+        values['Comentario'] = f"{reason} (Confianza: {confidence}%)"
+        item["values"] = values
+        
+        # --- Paso D: EVIDENCIA (Screenshot + Highlight Láser) según la política ---------
+        evidence_job = {
+            "url": web_data.get('url_evidencia', item["raw_url"]),
+            "quote": analysis.get('evidence_quote', ''),
+            "snapshot": web_data.get('snapshot_path')
+        }
+        if self.evidence_policy == "always" or (self.evidence_policy == "rejected-only" and decision == 'R'):
+            screenshot_path = self.scraper.take_screenshot(
+                evidence_job["url"], evidence_job["quote"], evidence_job["snapshot"],
+                run_id=self.run_id, row=item["index"]
+            )
             if screenshot_path:
-                abs_path = os.path.abspath(screenshot_path)
-                results_df.at[index, 'Link Evidencia'] = f'=HYPERLINK("{abs_path}", "Ver Evidencia")'
+                values['Link Evidencia'] = self._evidence_link(screenshot_path)
+                item["evidence_shot"] = {"path": screenshot_path, "url": evidence_job["url"]}
+        else:
+            # "deferred" (o aceptada en "rejected-only"): queda en cola para el final o para la UI
+            item["evidence_job"] = evidence_job
+
+    @staticmethod
+    def _evidence_link(screenshot_path):
+        # Hyperlink local para el Excel
+        return f'=HYPERLINK("{os.path.abspath(screenshot_path)}", "Ver Evidencia")'
+
+    def _render_evidence_batch(self, indices, progress_callback=None):
+        """
+        Genera en paralelo (pool de workers) las capturas pendientes de las filas indicadas.
+        Devuelve {índice de fila: fórmula HYPERLINK} de las que se han generado.
+        """
+        indices = [i for i in indices if i in self.pending_evidence]
+        if not indices:
+            return {}
         
-        # 3. Guardar resultados
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f"Matriz_Trabajada_{timestamp}.xlsx"
-        output_path = os.path.join(self.output_folder, output_filename)
+        # Filas con la misma captura pendiente (web compartida): se renderiza una vez para todas
+        jobs = {}
+        for i in indices:
+            job = self.pending_evidence[i]
+            jobs.setdefault((job["url"], job["quote"], job.get("snapshot")), []).append(i)
         
-        results_df.to_excel(output_path, index=False)
-        print(f"✅ Proceso terminado. Archivo guardado en: {output_path}")
+        links = {}
+        with ThreadPoolExecutor(max_workers=self.scraper.pool.size) as executor:
+            futures = {
+                executor.submit(
+                    self.scraper.take_screenshot, url, quote, snapshot, run_id=self.run_id, row=members[0]
+                ): (url, members)
+                for (url, quote, snapshot), members in jobs.items()
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                url, members = futures[future]
+                screenshot_path = future.result()
+                if screenshot_path:
+                    # La captura se archivó a nombre de la primera fila; el resto también va al índice
+                    for index in members[1:]:
+                        try:
+                            self.scraper.evidence_store.link(screenshot_path, run_id=self.run_id, row=index, url=url)
+                        except OSError as e:
+                            print(f"⚠️ No se pudo anotar la evidencia de la fila {index}: {e}")
+                    for index in members:
+                        links[index] = self._evidence_link(screenshot_path)
+                        del self.pending_evidence[index]
+                if progress_callback:
+                    progress_callback(done, len(futures), f'Evidencia {done}/{len(futures)}')
+        return links
+
+    def render_evidence(self, result, indices=None):
+        """
+        Evidencia bajo demanda (p.ej. al seleccionar una fila en la tabla de Streamlit).
+        Genera las capturas pendientes de `indices` (todas si es None), actualiza
+        'Link Evidencia' en el dataframe y reescribe el Excel de salida.
+        """
+        self.pending_evidence = dict(result.get("pending_evidence") or {})
+        self.run_id = result.get("run_id")
+        results_df = result["dataframe"]
         
-        return {"status": "success", "file_path": output_path, "dataframe": results_df}
+        links = self._render_evidence_batch(list(self.pending_evidence) if indices is None else list(indices))
+        self.scraper.close()
+        
+        for index, link in links.items():
+            results_df.at[index, 'Link Evidencia'] = link
+        if links:
+            write_xlsx(result["file_path"], results_df)
+        result["pending_evidence"] = self.pending_evidence
+        return len(links)
+
 
 if __name__ == "__main__":
     import asyncio
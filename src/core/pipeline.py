@@ -0,0 +1,186 @@
+import time
+import queue
+import threading
+
+
+class _EndOfStream:
+    """Marca de fin: cada hilo de una etapa consume una y la última la propaga."""
+
+
+END = _EndOfStream()
+
+
+class Stage:
+    """
+    Etapa del pipeline: `fn` se ejecuta en `workers` hilos propios que leen de una cola acotada
+    y modifica los items (dicts) en su sitio. Con batch_size > 1, `fn` recibe una lista de items
+    (espera como mucho `linger` s a llenarla); si no, recibe un item.
+    Los items con item["done"] = True atraviesan la etapa sin llamar a `fn`.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=None, batch_size=1, linger=0.0):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.queue_size = queue_size
+        self.batch_size = max(1, int(batch_size))
+        self.linger = linger
+        self.inbox = None
+        self.busy_seconds = 0.0
+        self.put_wait_seconds = 0.0  # tiempo que la etapa anterior pasó bloqueada por la cola llena
+        self.items = 0
+        self.in_flight = 0          # items que la etapa está procesando ahora mismo
+        self.peak_in_flight = 0
+        self.peak_queue_depth = 0   # máximo de items esperando en la cola de entrada
+        self._alive = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Etapas conectadas por colas acotadas (backpressure): si una etapa va lenta, la anterior
+    se bloquea al llenar la cola en vez de acumular trabajo en memoria.
+    `run` devuelve los items en el orden de su número de secuencia, lleguen en el orden que lleguen.
+    """
+
+    def __init__(self, stages, queue_size=16):
+        self.stages = stages
+        for stage in stages:
+            stage.inbox = queue.Queue(maxsize=stage.queue_size or queue_size)
+        self.outbox = queue.Queue(maxsize=queue_size)
+        self.started_at = None
+        self.finished_at = None
+        self.completed = 0  # items terminados (en cualquier orden)
+        self.feed_error = None  # excepción del generador de entrada, se relanza al final de `run`
+
+    def _put(self, position, item):
+        """Entrega `item` a la etapa `position` (o a la salida) midiendo la espera por backpressure."""
+        if position >= len(self.stages):
+            self.outbox.put(item)
+            return
+        stage = self.stages[position]
+        started = time.monotonic()
+        stage.inbox.put(item)
+        waited = time.monotonic() - started
+        with stage._lock:
+            stage.put_wait_seconds += waited
+            stage.peak_queue_depth = max(stage.peak_queue_depth, stage.inbox.qsize())
+
+    def _take_batch(self, stage):
+        """Primer item bloqueando; el resto del lote sólo mientras dure `linger`. Devuelve (items, fin)."""
+        first = stage.inbox.get()
+        if first is END:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + stage.linger
+        while len(batch) < stage.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = stage.inbox.get(timeout=remaining) if remaining > 0 else stage.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self, position):
+        stage = self.stages[position]
+        finished = False
+        while not finished:
+            batch, finished = self._take_batch(stage)
+            if batch:
+                todo = [item for item in batch if not item.get("done")]
+                if todo:
+                    started = time.monotonic()
+                    with stage._lock:
+                        stage.in_flight += len(todo)
+                        stage.peak_in_flight = max(stage.peak_in_flight, stage.in_flight)
+                    try:
+                        if stage.batch_size > 1:
+                            stage.fn(todo)
+                        else:
+                            stage.fn(todo[0])
+                    except Exception as e:
+                        for item in todo:
+                            item["error"] = f"{stage.name}: {e}"
+                            item["done"] = True
+                    with stage._lock:
+                        stage.in_flight -= len(todo)
+                        stage.busy_seconds += time.monotonic() - started
+                        stage.items += len(todo)
+                for item in batch:
+                    self._put(position + 1, item)
+
+        # El último hilo de la etapa avisa a la siguiente (una marca por cada hilo de ella)
+        with stage._lock:
+            stage._alive -= 1
+            last = stage._alive == 0
+        if last:
+            following = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            for _ in range(following):
+                self._put(position + 1, END)
+
+    def _feed(self, items):
+        try:
+            for item in items:
+                self._put(0, item)
+        except Exception as e:
+            self.feed_error = e
+        finally:
+            for _ in range(self.stages[0].workers if self.stages else 1):
+                self._put(0, END)
+
+    def run(self, items):
+        """
+        Procesa `items` (dicts con una clave "seq" densa 0..N-1 asignada en el orden de entrada).
+        Generador: entrega los items terminados en orden de "seq".
+        """
+        self.started_at = time.monotonic()
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            stage._alive = stage.workers
+            threads += [
+                threading.Thread(target=self._work, args=(position,), daemon=True, name=f"{stage.name}-{n}")
+                for n in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        pending, next_seq = {}, 0
+        while True:
+            item = self.outbox.get()
+            if item is END:
+                break
+            self.completed += 1
+            pending[item["seq"]] = item
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+
+        # Si faltara algún número de secuencia, no perdemos los items que quedaron esperando
+        for seq in sorted(pending):
+            yield pending[seq]
+        self.finished_at = time.monotonic()
+        if self.feed_error is not None:
+            raise self.feed_error
+
+    def get_stats(self):
+        """Utilización por etapa: tiempo ocupado / (hilos × duración). La más alta es el cuello de botella."""
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        stats = {}
+        for stage in self.stages:
+            capacity = stage.workers * elapsed
+            stats[stage.name] = {
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_s": round(stage.busy_seconds, 1),
+                "utilisation": round(stage.busy_seconds / capacity, 3) if capacity else 0.0,
+                "blocked_upstream_s": round(stage.put_wait_seconds, 1),
+                "queue_depth": stage.inbox.qsize() if stage.inbox else 0,
+                "peak_queue_depth": stage.peak_queue_depth,
+                "in_flight": stage.in_flight,
+                "peak_in_flight": stage.peak_in_flight
+            }
+        busiest = max(stats, key=lambda name: stats[name]["utilisation"]) if stats else None
+        return {"elapsed_s": round(elapsed, 1), "stages": stats, "bottleneck": busiest}
@@ -0,0 +1,139 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+
+from core import config
+
+
+# Cabeceras de página que pone text_cleaner.clean_pages ("--- HOME (...) ---")
+PAGE_HEADER_PATTERN = re.compile(r'^--- .* ---$')
+WORD_PATTERN = re.compile(r'[a-z0-9]{3,}')
+
+# Parámetros estándar de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _fold(text):
+    """Minúsculas y sin tildes: 'Fábrica' y 'fabrica' puntúan igual."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def _tokens(text):
+    return WORD_PATTERN.findall(_fold(text))
+
+
+def split_passages(text, target_chars=None):
+    """
+    Trocea el texto en pasajes de ~target_chars agrupando líneas consecutivas de la misma página.
+    Devuelve [{"header", "text", "position"}] en el orden original.
+    """
+    target_chars = target_chars or config.CONTEXT_PASSAGE_CHARS
+    passages = []
+    header = ""
+    buffer = []
+
+    def flush():
+        if buffer:
+            passages.append({"header": header, "text": "\n".join(buffer), "position": len(passages)})
+            buffer.clear()
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if PAGE_HEADER_PATTERN.match(line):
+            flush()
+            header = line
+            continue
+        # Líneas kilométricas (webs sin saltos): las partimos para que quepan en el presupuesto
+        for start in range(0, len(line), target_chars * 2):
+            buffer.append(line[start:start + target_chars * 2])
+            if sum(len(l) for l in buffer) >= target_chars:
+                flush()
+    flush()
+    return passages
+
+
+def _query(client_description):
+    """Términos de búsqueda: señales de decisión (con peso) + palabras de la descripción del cliente."""
+    weights = {_fold(term): weight for term, weight in config.CONTEXT_SIGNAL_TERMS.items()}
+    for token in _tokens(client_description or ""):
+        if token not in weights and len(token) >= 4:
+            weights[token] = config.CONTEXT_CLIENT_WEIGHT
+    return weights
+
+
+def score_passages(passages, client_description):
+    """Puntúa cada pasaje con BM25 (los términos casan por prefijo: 'filial' -> 'filiales')."""
+    query = _query(client_description)
+    docs = [Counter(_tokens(p["text"])) for p in passages]
+    if not docs:
+        return []
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1.0
+
+    # Frecuencia de cada término (por prefijo) en cada pasaje
+    term_freqs = {
+        term: [sum(n for word, n in doc.items() if word.startswith(term)) for doc in docs]
+        for term in query
+    }
+
+    scores = []
+    for i, doc in enumerate(docs):
+        length = sum(doc.values())
+        score = 0.0
+        for term, weight in query.items():
+            tf = term_freqs[term][i]
+            if not tf:
+                continue
+            df = sum(1 for freq in term_freqs[term] if freq)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += weight * idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def pack_context(text, client_description, budget_chars=None):
+    """
+    Rellena el presupuesto de caracteres con los pasajes más relevantes, en su orden original.
+    El primer pasaje (presentación de la home) entra siempre. Devuelve (texto, estadísticas).
+    """
+    budget_chars = budget_chars or config.LLM_CONTEXT_CHARS
+    text = text or ""
+    stats = {"chars_in": len(text), "chars_out": len(text), "passages": 0, "passages_kept": 0}
+    if len(text) <= budget_chars:
+        return text, stats
+
+    passages = split_passages(text)
+    scores = score_passages(passages, client_description)
+    stats["passages"] = len(passages)
+
+    ranked = sorted(range(len(passages)), key=lambda i: (i != 0, -scores[i], i))
+    chosen, headers, used = set(), set(), 0
+    for i in ranked:
+        header = passages[i]["header"]
+        cost = len(passages[i]["text"]) + 1 + (len(header) + 1 if header not in headers else 0)
+        if used + cost > budget_chars:
+            continue
+        chosen.add(i)
+        headers.add(header)
+        used += cost
+
+    # Reconstruimos en orden original, con la cabecera de cada página y "[...]" donde hay huecos
+    lines, last_header, last_position = [], None, None
+    for i in sorted(chosen):
+        passage = passages[i]
+        if passage["header"] != last_header:
+            lines.append(passage["header"])
+            last_header = passage["header"]
+        elif last_position is not None and passage["position"] != last_position + 1:
+            lines.append("[...]")
+        lines.append(passage["text"])
+        last_position = passage["position"]
+
+    packed = "\n".join(line for line in lines if line) or text[:budget_chars]
+    stats["chars_out"] = len(packed)
+    stats["passages_kept"] = len(chosen)
+    return packed, stats
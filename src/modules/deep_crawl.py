@@ -0,0 +1,78 @@
+import re
+from urllib.parse import urljoin, urlparse
+
+from core import config
+from modules.politeness import host_of
+
+
+# Enlaces que nunca merece la pena visitar
+SKIP_EXTENSIONS = re.compile(r'\.(?:pdf|jpe?g|png|gif|svg|webp|zip|rar|docx?|xlsx?|pptx?|mp4|mp3)$', re.IGNORECASE)
+SKIP_SCHEMES = ("mailto:", "tel:", "javascript:", "whatsapp:", "#")
+
+
+def _slug(text):
+    """'Quiénes somos' -> 'quienes-somos' (para buscar la palabra clave en la URL)."""
+    table = str.maketrans("áéíóúàèìòùäëïöüñç", "aeiouaeiouaeiounc")
+    return re.sub(r'[^a-z0-9]+', '-', text.lower().translate(table)).strip('-')
+
+
+def score_link(href, text, base_url):
+    """
+    Puntúa un enlace por relevancia para decidir grupo/función.
+    Devuelve (puntuación, url_absoluta); puntuación 0 = no visitar.
+    """
+    href = (href or '').strip()
+    if not href or href.lower().startswith(SKIP_SCHEMES):
+        return 0, None
+
+    absolute = urljoin(base_url, href).split('#')[0]
+    parsed = urlparse(absolute)
+    if parsed.scheme not in ("http", "https") or SKIP_EXTENSIONS.search(parsed.path):
+        return 0, None
+
+    # Mismo sitio (ignorando 'www.'), y que no sea la propia home
+    if host_of(absolute) != host_of(base_url):
+        return 0, None
+    if absolute.rstrip('/') == base_url.split('#')[0].rstrip('/') or parsed.path in ('', '/'):
+        return 0, None
+
+    text = ' '.join((text or '').lower().split())
+    path = _slug(parsed.path)
+
+    score = 0.0
+    for keyword, weight in config.DEEP_LINK_KEYWORDS.items():
+        if keyword in text:
+            score += weight
+        elif _slug(keyword) in path:
+            score += weight * 0.6  # la URL cuenta algo menos que el texto visible
+
+    if score:
+        # Penalizamos rutas muy profundas (suelen ser posts o fichas, no páginas institucionales)
+        score -= 1.0 * max(0, parsed.path.strip('/').count('/') - 1)
+    return max(score, 0), absolute
+
+
+def rank_links(links, base_url, limit=None):
+    """
+    links: [(href, texto)]. Devuelve [(puntuación, url)] ordenado de mayor a menor,
+    sin duplicados y como mucho `limit` (DEEP_CRAWL_MAX_PAGES por defecto).
+    """
+    limit = config.DEEP_CRAWL_MAX_PAGES if limit is None else limit
+    best = {}
+    for href, text in links:
+        score, absolute = score_link(href, text, base_url)
+        if score > 0:
+            key = absolute.rstrip('/')
+            if score > best.get(key, (0, None))[0]:
+                best[key] = (score, absolute)
+
+    ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)
+    return ranked[:limit]
+
+
+def pick_evidence(pages, default_url):
+    """URL de evidencia: la subpágina mejor puntuada con texto suficiente; si no, la home."""
+    candidates = [p for p in pages if p.get("score") and len(p["text"]) >= config.DEEP_MIN_SUBPAGE_CHARS]
+    if not candidates:
+        return default_url
+    return max(candidates, key=lambda p: p["score"])["url"]
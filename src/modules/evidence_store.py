@@ -0,0 +1,100 @@
+import os
+import io
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+from core import config
+
+# Pillow es opcional: sólo hace falta para guardar en WebP
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def capture_format(image_format=None):
+    """Formato que pedimos a Playwright (sólo sabe PNG y JPEG; WebP se convierte después)."""
+    image_format = (image_format or config.EVIDENCE_FORMAT).lower()
+    if image_format == "webp":
+        return "png" if Image is not None else "jpeg"
+    return "jpeg" if image_format in ("jpg", "jpeg") else "png"
+
+
+class EvidenceStore:
+    """
+    Almacén de capturas direccionado por contenido.
+    Cada imagen se guarda como evidence/<hash>.<ext>: dos ejecuciones que generan la misma
+    captura comparten fichero en disco. evidence/index.jsonl relaciona ejecución/fila -> fichero.
+    """
+
+    def __init__(self, directory=None, image_format=None, quality=None):
+        self.directory = directory or config.EVIDENCE_DIR
+        self.image_format = (image_format or config.EVIDENCE_FORMAT).lower()
+        self.quality = quality or config.EVIDENCE_QUALITY
+        self.index_path = os.path.join(self.directory, "index.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def temp_path(self, job_id):
+        """Ruta provisional donde el worker escribe la captura antes de archivarla."""
+        return os.path.join(self.directory, f".tmp_{job_id}.{capture_format(self.image_format)}")
+
+    def _encode(self, raw_path):
+        """Devuelve (bytes, extensión) en el formato final (WebP si hay Pillow)."""
+        extension = os.path.splitext(raw_path)[1].lstrip(".")
+        if self.image_format == "webp" and Image is not None:
+            buffer = io.BytesIO()
+            with Image.open(raw_path) as image:
+                image.save(buffer, format="WEBP", quality=self.quality, method=4)
+            return buffer.getvalue(), "webp"
+        with open(raw_path, "rb") as f:
+            return f.read(), "jpg" if extension == "jpeg" else extension
+
+    def store(self, raw_path, run_id=None, row=None, url=None):
+        """
+        Archiva la captura provisional `raw_path` bajo su hash y la anota en el índice.
+        Devuelve (ruta definitiva, entrada del índice).
+        """
+        try:
+            data, extension = self._encode(raw_path)
+        finally:
+            try:
+                os.remove(raw_path)
+            except OSError:
+                pass
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, f"{digest[:24]}.{extension}")
+
+        with self._lock:
+            deduped = os.path.exists(path)
+            if not deduped:
+                with open(path, "wb") as f:
+                    f.write(data)
+
+            entry = self._index(run_id, row, url, path, digest, len(data), deduped)
+
+        return path, entry
+
+    def link(self, path, run_id=None, row=None, url=None):
+        """
+        Anota en el índice otra fila que usa una captura ya archivada (filas con la misma web):
+        cada fila del Excel con 'Link Evidencia' tiene su propia entrada.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            return self._index(run_id, row, url, path, digest, len(data), True)
+
+    def _index(self, run_id, row, url, path, digest, size, deduped):
+        """Añade una entrada a index.jsonl (con el lock tomado)."""
+        entry = {
+            "run_id": run_id, "row": row, "url": url, "path": path, "sha256": digest,
+            "bytes": size, "deduped": deduped, "created": datetime.now().isoformat(timespec="seconds")
+        }
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
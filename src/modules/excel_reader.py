@@ -0,0 +1,109 @@
+from openpyxl import load_workbook
+
+from core import config
+
+
+def _open(source):
+    """Abre el libro en modo read-only (las filas se leen del zip según se piden, sin cargarlo entero)."""
+    if hasattr(source, "seek"):
+        source.seek(0)  # el fichero subido en Streamlit se lee varias veces
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def _header(cells):
+    """Nombres de columna como los pondría pandas: 'Unnamed: N' si vacía y sufijo '.1' si repetida."""
+    names, seen = [], {}
+    for position, value in enumerate(cells):
+        name = str(value).strip() if value is not None else f"Unnamed: {position}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _columns(names, required, passthrough):
+    """Posiciones de las columnas a leer: las obligatorias, el nombre de empresa y las de paso."""
+    missing = [column for column in required if column not in names]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias en el Excel: {', '.join(missing)}")
+    if passthrough is None:
+        wanted = names
+    else:
+        always = set(required) | {config.INPUT_NAME_COLUMN}
+        wanted = [name for name in names if name in always or name in passthrough]
+    return [(names.index(name), name) for name in wanted]
+
+
+def read_header(source):
+    """Cabecera de la primera hoja (sin leer el resto del fichero)."""
+    workbook = _open(source)
+    try:
+        first = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        return _header(first)
+    finally:
+        workbook.close()
+
+
+def iter_column(source, column='Sitio web'):
+    """Valores de una sola columna (None si la celda está vacía), sin leer el resto de la fila."""
+    workbook = _open(source)
+    try:
+        sheet = workbook.active
+        names = _header(next(sheet.iter_rows(max_row=1, values_only=True), ()))
+        if column not in names:
+            raise ValueError(f"Falta la columna obligatoria '{column}' en el Excel")
+        position = names.index(column) + 1
+        for (value,) in sheet.iter_rows(min_row=2, min_col=position, max_col=position, values_only=True):
+            yield value
+    finally:
+        workbook.close()
+
+
+def count_rows(source, key_column='Sitio web'):
+    """(filas de datos, filas con `key_column` rellena) leyendo sólo esa columna."""
+    total = with_key = 0
+    for value in iter_column(source, key_column):
+        total += 1
+        if value is not None:
+            with_key += 1
+    return total, with_key
+
+
+def iter_chunks(source, chunk_size=None, required=None, passthrough=None):
+    """
+    Recorre la primera hoja en bloques de `chunk_size` filas (dicts columna -> valor).
+    Sólo se leen las columnas obligatorias y las de paso (`passthrough`; None = todas).
+    Las filas sin 'Sitio web' se descartan, como hacía el dropna sobre el dataframe.
+    Es un generador: en memoria sólo está el bloque en curso.
+    """
+    chunk_size = chunk_size or config.INPUT_CHUNK_ROWS
+    required = required or config.INPUT_REQUIRED_COLUMNS
+    passthrough = config.INPUT_PASSTHROUGH_COLUMNS if passthrough is None else passthrough
+
+    workbook = _open(source)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        selected = _columns(_header(next(rows, ())), required, passthrough)
+        chunk = []
+        for values in rows:
+            row = {name: values[position] if position < len(values) else None for position, name in selected}
+            if row.get('Sitio web') is None:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def output_columns(source, required=None, passthrough=None):
+    """Columnas de entrada que llegarán a la salida, en su orden original."""
+    required = required or config.INPUT_REQUIRED_COLUMNS
+    passthrough = config.INPUT_PASSTHROUGH_COLUMNS if passthrough is None else passthrough
+    return [name for _, name in _columns(read_header(source), required, passthrough)]
@@ -0,0 +1,72 @@
+import re
+from urllib.parse import urlparse
+
+from core import config
+
+
+class JunkDetector:
+    """
+    Detección de webs basura (dominio en venta, aparcado, vacío) lo antes posible:
+      1. redirecciones / host final contra hosts de parking y registradores,
+      2. cabeceras y tamaño de la respuesta (HTML casi vacío),
+      3. y sólo al final, el texto con un único regex precompilado.
+    Cada comprobación devuelve None o un veredicto {"rule", "detail", "stage"}.
+    """
+
+    def __init__(self):
+        self.parking_hosts = tuple(h.lower() for h in config.PARKING_HOSTS)
+        self.parking_headers = {k.lower(): v.lower() for k, v in config.PARKING_HEADERS.items()}
+        keywords = sorted(config.JUNK_KEYWORDS, key=len, reverse=True)
+        self.text_pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(k) for k in keywords) + r')\b', re.IGNORECASE
+        )
+
+    def _is_parking_host(self, host):
+        host = (host or '').lower()
+        return any(host == h or host.endswith('.' + h) for h in self.parking_hosts)
+
+    def check_redirects(self, urls):
+        """urls: cadena de redirección completa (incluida la URL final)."""
+        for url in urls:
+            try:
+                host = urlparse(url).hostname
+            except ValueError:
+                continue
+            if self._is_parking_host(host):
+                return {"rule": "parking_host", "detail": host, "stage": "redirect"}
+        return None
+
+    def check_headers(self, headers):
+        headers = {k.lower(): str(v).lower() for k, v in (headers or {}).items()}
+        for name, fragment in self.parking_headers.items():
+            if name in headers and fragment in headers[name]:
+                return {"rule": "parking_header", "detail": name, "stage": "headers"}
+        return None
+
+    def check_body_size(self, html):
+        """
+        Página vacía: muy pocos bytes y sin scripts, meta refresh ni marcos
+        (una home diminuta que redirige por JS, o el "reenvío enmascarado" de un registrador,
+        un <frameset>/<iframe> con la web real dentro, no es basura: hay que dejarla cargar).
+        """
+        if html is None or len(html) >= config.JUNK_MIN_CONTENT_LENGTH:
+            return None
+        lowered = html.lower()
+        if "<script" in lowered or "http-equiv" in lowered or "<frame" in lowered or "<iframe" in lowered:
+            return None
+        return {"rule": "empty_page", "detail": f"{len(html)} bytes", "stage": "headers"}
+
+    def check_text(self, text):
+        match = self.text_pattern.search(text or '')
+        if match:
+            return {"rule": "keyword", "detail": match.group(0).lower(), "stage": "text"}
+        return None
+
+    def check_response(self, urls, headers, html=None):
+        """Atajo para las comprobaciones baratas (antes de esperar ni leer el DOM)."""
+        return self.check_redirects(urls) or self.check_headers(headers) or self.check_body_size(html)
+
+
+def junk_message(verdict):
+    """Texto para error_msg / Comentario del Excel."""
+    return f"Junk detectado: {verdict['detail']} ({verdict['rule']})"
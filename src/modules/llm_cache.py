@@ -0,0 +1,67 @@
+import hashlib
+import threading
+
+from core import config
+from utils.sqlite_cache import SQLiteCache
+
+
+def _normalize(text):
+    """Colapsa espacios: el mismo texto con otro formateo debe dar la misma clave."""
+    return " ".join(str(text or "").split())
+
+
+class LLMCache:
+    """
+    Caché persistente de respuestas del LLM (JSON ya parseado).
+    Clave = hash(texto normalizado, descripción del cliente, versión del prompt, modelo):
+    si cambia la plantilla del prompt cambia su versión y las entradas antiguas dejan de usarse.
+    """
+
+    def __init__(self, prompt_version, path=None, ttl_hours=None, max_entries=None):
+        ttl_hours = config.LLM_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours
+        self.prompt_version = prompt_version
+        self.store = SQLiteCache(
+            path or config.LLM_CACHE_PATH,
+            table="llm_responses",
+            ttl_seconds=ttl_hours * 3600 if ttl_hours else None,
+            max_entries=max_entries or config.LLM_CACHE_MAX_ENTRIES
+        )
+        # Contamos por consulta (una por empresa), no por modelo probado
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, text_content, client_description, model_name):
+        fingerprint = "\x1f".join([
+            _normalize(text_content), _normalize(client_description), self.prompt_version, model_name
+        ])
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def lookup(self, text_content, client_description, models):
+        """Primera respuesta cacheada entre `models` (en orden de preferencia) o None."""
+        for model_name in models:
+            cached = self.store.get(self.key(text_content, client_description, model_name))
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                return cached
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def save(self, text_content, client_description, model_name, analysis):
+        self.store.set(self.key(text_content, client_description, model_name), analysis)
+
+    def stats(self):
+        store_stats = self.store.stats()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "evictions": store_stats["evictions"],
+            "entries": store_stats["entries"],
+            "prompt_version": self.prompt_version
+        }
@@ -0,0 +1,120 @@
+import time
+import random
+import threading
+
+from core import config
+
+
+def estimate_tokens(prompt):
+    """Estimación barata de tokens (≈4 caracteres por token) + la respuesta esperada."""
+    return len(prompt) // 4 + config.LLM_OUTPUT_TOKENS_ESTIMATE
+
+
+def is_quota_error(error):
+    """Gemini señala la cuota agotada con un 429 / RESOURCE_EXHAUSTED."""
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "quota" in message.lower()
+
+
+class TokenBucket:
+    """
+    Cubo de fichas que se rellena a `per_minute` unidades por minuto (ráfaga máxima = un minuto).
+    `reserve` descuenta siempre y devuelve cuánto hay que esperar: el saldo negativo es la cola.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= min(float(amount), self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _ModelLimiter:
+    """Límites de un modelo: peticiones/min (RPM), tokens/min (TPM) y pausa tras un 429."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Reserva hueco y duerme lo necesario (fuera del lock). Devuelve los segundos esperados."""
+        with self._lock:
+            wait = max(
+                self.requests.reserve(1),
+                self.tokens.reserve(tokens),
+                self.cooldown_until - time.monotonic()
+            )
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    def penalize(self, seconds):
+        """Tras un 429 todos los hilos frenan con este modelo, no sólo el que lo recibió."""
+        with self._lock:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+
+class LLMDispatcher:
+    """
+    Límites de las llamadas al LLM: `call` respeta un cubo RPM/TPM por modelo. El paralelismo lo
+    ponen los hilos de la etapa "llm" del pipeline (core.pipeline), que también informa de su cola.
+    Los 429 se reintentan con backoff exponencial + jitter antes de pasar al siguiente modelo.
+    """
+
+    def __init__(self, concurrency=None, rate_limits=None):
+        self.concurrency = max(1, int(concurrency or config.LLM_CONCURRENCY))
+        self.rate_limits = rate_limits or config.LLM_RATE_LIMITS
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "retries_429": 0, "throttled_waits": 0, "throttled_seconds": 0.0
+        }
+
+    def _limiter(self, model_name):
+        with self._lock:
+            if model_name not in self._limiters:
+                limits = self.rate_limits.get(model_name, config.LLM_DEFAULT_RATE_LIMIT)
+                self._limiters[model_name] = _ModelLimiter(limits["rpm"], limits["tpm"])
+            return self._limiters[model_name]
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def call(self, model_name, request_fn, tokens):
+        """
+        Ejecuta request_fn() dentro de los límites de `model_name`.
+        Reintenta los errores de cuota; cualquier otro error (o agotar reintentos) se relanza.
+        """
+        limiter = self._limiter(model_name)
+        for attempt in range(config.LLM_MAX_RETRIES + 1):
+            waited = limiter.acquire(tokens)
+            if waited:
+                self._bump("throttled_waits")
+                self._bump("throttled_seconds", waited)
+
+            self._bump("calls")
+            try:
+                return request_fn()
+            except Exception as e:
+                if not is_quota_error(e) or attempt == config.LLM_MAX_RETRIES:
+                    raise
+                delay = min(config.LLM_BACKOFF_MAX, config.LLM_BACKOFF_BASE * 2 ** attempt)
+                limiter.penalize(delay * random.uniform(0.5, 1.5))
+                self._bump("retries_429")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 1)
+        stats["concurrency"] = self.concurrency
+        return stats
@@ -1,15 +1,101 @@
 import os
 import json
 import time
+import hashlib
+import threading
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from core import config
+from modules.llm_dispatcher import LLMDispatcher, estimate_tokens, is_quota_error
+from modules.llm_cache import LLMCache
+from modules.model_router import ModelRouter
+from modules.context_packer import pack_context
+
 # Cargamos las claves del archivo .env
 load_dotenv()
 
+# Plantilla del prompt. Su hash es la versión: si se toca, la caché de respuestas se invalida sola.
+PROMPT_TEMPLATE = """
+        Rol: Auditor de Precios de Transferencia.
+        Objetivo: Determinar si la empresa analizada es comparable a la del cliente.
+        
+        CLIENTE: "{client_description}"
+        
+        TEXTO DE LA EMPRESA ANALIZADA:
+        "{text_content}"
+        
+        INSTRUCCIONES:
+        Devuelve ÚNICAMENTE un objeto JSON válido. No escribas nada más.
+        - evidence_quote: Debe ser una pequeña frase extraída LITERALMENTE del texto. 
+          NO resumas, NO añadas puntos si no existen, copia y pega un fragmento exacto que justifique el rechazo.
+        
+        ESQUEMA JSON:
+        {{
+            "is_group": boolean, (True si menciona grupo, holding, filial, headquarters, subsidiaria o similares)
+            "is_manufacturer": boolean, (True si menciona fábrica, producción, planta industrial. False si es servicios/distribución)
+            "service_match": boolean, (True si la actividad coincide con la del cliente. No seas demasiado estricto eso luego lo indicaras en el confidence_score)
+            "reasoning": "string", (Resumen muy breve del porqué)
+            "evidence_quote": "string", (Frase literal corta que demuestre el rechazo. Vacío si se acepta)
+            "confidence_score": int (0-100), (Indica la confianza que le determinas a tu aceptación o rechazo. Al ser más flexible habrán situaciones donde la confianza que pongas sea mas baja pero eso no es problema. Eso se marcará para que lo revise un humano)
+        }}
+        """
+
+# Modo lote: la parte fija (rol, cliente, reglas, esquema) una sola vez y N empresas marcadas por id
+BATCH_PROMPT_TEMPLATE = """
+        Rol: Auditor de Precios de Transferencia.
+        Objetivo: Determinar, para CADA empresa analizada, si es comparable a la del cliente.
+        
+        CLIENTE: "{client_description}"
+        
+        EMPRESAS ANALIZADAS (cada una empieza por "### ID: <id>" seguido de su texto):
+        {companies}
+        
+        INSTRUCCIONES:
+        Devuelve ÚNICAMENTE un array JSON válido con un objeto por empresa. No escribas nada más.
+        - id: el ID exacto de la empresa, tal y como aparece tras "### ID:".
+        - Analiza cada empresa por separado, sin mezclar información entre ellas.
+        - evidence_quote: Debe ser una pequeña frase extraída LITERALMENTE del texto de ESA empresa. 
+          NO resumas, NO añadas puntos si no existen, copia y pega un fragmento exacto que justifique el rechazo.
+        
+        ESQUEMA JSON DE CADA ELEMENTO DEL ARRAY:
+        {{
+            "id": "string", (ID de la empresa)
+            "is_group": boolean, (True si menciona grupo, holding, filial, headquarters, subsidiaria o similares)
+            "is_manufacturer": boolean, (True si menciona fábrica, producción, planta industrial. False si es servicios/distribución)
+            "service_match": boolean, (True si la actividad coincide con la del cliente. No seas demasiado estricto eso luego lo indicaras en el confidence_score)
+            "reasoning": "string", (Resumen muy breve del porqué)
+            "evidence_quote": "string", (Frase literal corta que demuestre el rechazo. Vacío si se acepta)
+            "confidence_score": int (0-100), (Confianza en tu aceptación o rechazo. Si es baja se marcará para revisión humana)
+        }}
+        """
+COMPANY_TEMPLATE = '### ID: {row_id}\n"{text_content}"\n'
+
+# Las respuestas sueltas y las de lote comparten caché: la versión depende de ambas plantillas
+PROMPT_VERSION = hashlib.sha256((PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE).encode("utf-8")).hexdigest()[:12]
+
+# Esquema de cada análisis (se valida elemento a elemento en el modo lote)
+RESULT_FIELDS = {
+    "is_group": bool, "is_manufacturer": bool, "service_match": bool,
+    "reasoning": str, "evidence_quote": str, "confidence_score": (int, float)
+}
+INSUFFICIENT_RESULT = {
+    "is_group": False, "is_manufacturer": False, "service_match": False,
+    "reasoning": "Contenido web insuficiente o inaccesible.",
+    "evidence_quote": "", "confidence_score": 0
+}
+FAILED_RESULT = {
+    "is_group": False, 
+    "is_manufacturer": False, 
+    "service_match": False,
+    "reasoning": "Error de conexión con IA (Todos los modelos fallaron).", 
+    "evidence_quote": "", 
+    "confidence_score": 0
+}
+
 class LLMEngine:
     
-    def __init__(self):
+    def __init__(self, concurrency=None, use_cache=True, batch_size=None, cascade=None):
         # 1. GESTIÓN DE API KEY
         self.api_key = os.getenv("GOOGLE_API_KEY")
         
@@ -22,6 +108,42 @@ class LLMEngine:
             genai.configure(api_key=self.api_key)
         except Exception as e:
             print(f"❌ Error iniciando cliente Gemini: {e}")
+        
+        # Límites RPM/TPM por modelo, reintentos con backoff y llamadas en paralelo
+        self.dispatcher = LLMDispatcher(concurrency=concurrency)
+        
+        # Instancias reutilizadas, cooldown de modelos caídos y orden por salud
+        self.router = ModelRouter(genai.GenerativeModel)
+        
+        # Caché de respuestas (use_cache=False -> ni lee ni guarda en esta ejecución)
+        self.cache = LLMCache(PROMPT_VERSION) if use_cache else None
+        
+        # Empresas por petición en analyze_batch (1 = una llamada por empresa)
+        self.batch_size = max(1, int(batch_size or config.LLM_BATCH_SIZE))
+        self._stats_lock = threading.Lock()
+        self.batch_stats = {"batch_size": self.batch_size, "batches": 0, "batched_items": 0, "fallbacks": 0}
+        self.context_stats = {"texts": 0, "packed": 0, "chars_in": 0, "chars_out": 0}
+        
+        # Cascada: modelo barato primero y sólo las filas dudosas al modelo fuerte
+        self.cascade = config.LLM_CASCADE_ENABLED if cascade is None else cascade
+        self.cascade_stats = {"rows": 0, "escalated": 0, "strong_failed": 0}
+
+    def get_stats(self):
+        """Métricas del LLM para el resumen de la ejecución."""
+        return {
+            "dispatcher": self.dispatcher.get_stats(),
+            "models": self.router.get_stats(),
+            "cache": self.cache.stats() if self.cache else None,
+            "batch": dict(self.batch_stats),
+            "context": dict(self.context_stats),
+            "cascade": self._cascade_summary() if self.cascade else None
+        }
+
+    def _cascade_summary(self):
+        with self._stats_lock:
+            stats = dict(self.cascade_stats)
+        stats["escalation_rate"] = round(stats["escalated"] / stats["rows"], 3) if stats["rows"] else 0.0
+        return stats
 
     def _clean_json(self, text):
         """
@@ -43,77 +165,68 @@ class LLMEngine:
              return text[start:end]
         return text
 
-    def analyze(self, text_content, client_description):
-        """
-        Analiza el texto de la web y devuelve el JSON estructurado.
-        """
-        
-        # Validación básica de entrada
-        if not text_content or len(text_content) < 50:
-            return {
-                "is_group": False, "is_manufacturer": False, "service_match": False,
-                "reasoning": "Contenido web insuficiente o inaccesible.",
-                "evidence_quote": "", "confidence_score": 0
-            }
+    def _clean_json_array(self, text):
+        """Igual que _clean_json pero para el modo lote: extrae lo que hay entre [ y ]."""
+        start = text.find("[")
+        end = text.rfind("]") + 1
+        return text[start:end] if start != -1 and end > start else text.strip()
 
-        # Prompt Estricto
-        prompt = f"""
-        Rol: Auditor de Precios de Transferencia.
-        Objetivo: Determinar si la empresa analizada es comparable a la del cliente.
-        
-        CLIENTE: "{client_description}"
-        
-        TEXTO DE LA EMPRESA ANALIZADA:
-        "{text_content[:8000]}"
-        
-        INSTRUCCIONES:
-        Devuelve ÚNICAMENTE un objeto JSON válido. No escribas nada más.
-        - evidence_quote: Debe ser una pequeña frase extraída LITERALMENTE del texto. 
-          NO resumas, NO añadas puntos si no existen, copia y pega un fragmento exacto que justifique el rechazo.
-        
-        ESQUEMA JSON:
-        {{
-            "is_group": boolean, (True si menciona grupo, holding, filial, headquarters, subsidiaria o similares)
-            "is_manufacturer": boolean, (True si menciona fábrica, producción, planta industrial. False si es servicios/distribución)
-            "service_match": boolean, (True si la actividad coincide con la del cliente. No seas demasiado estricto eso luego lo indicaras en el confidence_score)
-            "reasoning": "string", (Resumen muy breve del porqué)
-            "evidence_quote": "string", (Frase literal corta que demuestre el rechazo. Vacío si se acepta)
-            "confidence_score": int (0-100), (Indica la confianza que le determinas a tu aceptación o rechazo. Al ser más flexible habrán situaciones donde la confianza que pongas sea mas baja pero eso no es problema. Eso se marcará para que lo revise un humano)
-        }}
-        """
+    @staticmethod
+    def _validate(item):
+        """Devuelve el análisis con el esquema de analyze() o None si falta/no encaja algún campo."""
+        if not isinstance(item, dict):
+            return None
+        for field, kind in RESULT_FIELDS.items():
+            if not isinstance(item.get(field), kind):
+                return None
+        analysis = {field: item[field] for field in RESULT_FIELDS}
+        analysis["confidence_score"] = int(analysis["confidence_score"])
+        return analysis
 
-        # LISTA DE MODELOS A PROBAR (En orden de preferencia)
-        # 1. gemini-1.5-flash: El mejor balance (gratis 1500/día).
-        # 2. gemini-pro: El clásico (gratis 60/min), muy estable.
-        models_to_try = [
-            'gemini-2.5-flash',
-            'gemini-2.5-flash-lite', 
-            'gemini-2.0-flash',    
-            'gemini-2.0-flash-001',       
-            'gemini-2.0-flash-lite-001',         
-            'gemini-2.0-flash-lite',          
-        ]
+    @staticmethod
+    def _tier(tier):
+        """(modelos, presupuesto de contexto) de cada nivel: normal, o rápido/fuerte en modo cascada."""
+        if tier == "fast":
+            return config.LLM_CASCADE_FAST_MODELS, config.LLM_CASCADE_FAST_CONTEXT_CHARS
+        if tier == "strong":
+            return config.LLM_CASCADE_STRONG_MODELS, config.LLM_CASCADE_STRONG_CONTEXT_CHARS
+        return config.LLM_MODELS, config.LLM_CONTEXT_CHARS
 
-        for model_name in models_to_try:
+    def _generate(self, prompt, tokens, parse, models=None):
+        """
+        Prueba los modelos (todos o sólo `models`) hasta que uno devuelva algo que `parse` acepte.
+        Devuelve (modelo, resultado parseado) o (None, None) si fallan todos.
+        """
+        # MODELOS A PROBAR: los disponibles, ordenados por el router (éxito, latencia, preferencia)
+        for model_name in self.router.candidates(models):
             try:
-                # Instanciamos el modelo
-                model = genai.GenerativeModel(model_name)
+                # Instancia cacheada del modelo
+                model = self.router.model(model_name)
+                latency = []
+                
+                def request():
+                    started = time.monotonic()
+                    response = model.generate_content(prompt)
+                    latency.append(time.monotonic() - started)
+                    return response
                 
-                # Generamos contenido (Sin forzar configuración JSON para evitar errores de versión)
-                response = model.generate_content(prompt)
+                # Generamos contenido (Sin forzar configuración JSON para evitar errores de versión).
+                # El dispatcher espera turno en el cubo RPM/TPM del modelo y reintenta los 429.
+                response = self.dispatcher.call(model_name, request, tokens)
                 
                 if response.text:
                     # Limpiamos y parseamos
-                    json_str = self._clean_json(response.text)
-                    return json.loads(json_str)
+                    result = parse(response.text)
+                    self.router.record_success(model_name, latency[-1])
+                    return model_name, result
                 
             except Exception as e:
-                # Si es un error de cuota (429), esperamos un poco
+                self.router.record_failure(model_name, e)
+                # Si es un error de cuota (429), el dispatcher ya agotó sus reintentos con backoff
                 error_msg = str(e)
-                if "429" in error_msg:
-                    print(f"⏳ Cuota excedida en {model_name}. Esperando 5s...")
-                    time.sleep(5)
-                    continue # Reintentamos o pasamos al siguiente
+                if is_quota_error(e):
+                    print(f"⏳ Cuota excedida en {model_name} tras {config.LLM_MAX_RETRIES} reintentos. Probando siguiente...")
+                    continue # Pasamos al siguiente modelo
                 elif "404" in error_msg:
                     print(f"⚠️ Modelo {model_name} no encontrado. Probando siguiente...")
                     continue # Pasamos al siguiente modelo de la lista
@@ -121,12 +234,179 @@ class LLMEngine:
                     print(f"⚠️ Error desconocido en {model_name}: {e}")
                     # Si falla, intentamos el siguiente modelo por si acaso
 
-        # SI FALLAN TODOS LOS MODELOS:
-        return {
-            "is_group": False, 
-            "is_manufacturer": False, 
-            "service_match": False,
-            "reasoning": "Error de conexión con IA (Todos los modelos fallaron).", 
-            "evidence_quote": "", 
-            "confidence_score": 0
-        }
\ No newline at end of file
+        if not any(stats["available"] for stats in self.router.get_stats().values()):
+            print("⛔ Ningún modelo disponible: todos en cooldown por 404 o cuota agotada.")
+        return None, None
+
+    def analyze(self, text_content, client_description, tier="default"):
+        """
+        Analiza el texto de la web y devuelve el JSON estructurado.
+        `tier` elige modelos y presupuesto de contexto ("default", o "fast"/"strong" en cascada).
+        """
+        
+        # Validación básica de entrada
+        if not text_content or len(text_content) < 50:
+            return dict(INSUFFICIENT_RESULT)
+
+        # Sólo los pasajes más relevantes (es también el texto de la clave de la caché)
+        models, budget = self._tier(tier)
+        text_content = self._pack_context(text_content, client_description, budget)
+
+        # Misma web, mismo cliente, mismo prompt: reutilizamos la respuesta de otra ejecución
+        if self.cache:
+            cached = self.cache.lookup(text_content, client_description, models)
+            if cached is not None:
+                return cached
+
+        return self._analyze_single(text_content, client_description, tier)
+
+    def _analyze_single(self, text_content, client_description, tier="default"):
+        """Una llamada por empresa (sin mirar la caché, pero guardando en ella)."""
+        # Prompt Estricto
+        prompt = PROMPT_TEMPLATE.format(client_description=client_description, text_content=text_content)
+
+        model_name, analysis = self._generate(
+            prompt, estimate_tokens(prompt), lambda text: json.loads(self._clean_json(text)), self._tier(tier)[0]
+        )
+        if model_name is None:
+            # SI FALLAN TODOS LOS MODELOS:
+            return dict(FAILED_RESULT)
+
+        if self.cache:
+            self.cache.save(text_content, client_description, model_name, analysis)
+        return analysis
+
+    def analyze_batch(self, items, client_description, tier="default"):
+        """
+        Modo lote: varias empresas por petición (la parte fija del prompt se envía una vez).
+        `items` = [(id_fila, texto)]. Devuelve {id_fila: análisis} con el mismo esquema que analyze().
+        Las empresas que falten en la respuesta o vengan mal formadas se reintentan una a una.
+        """
+        models, budget = self._tier(tier)
+        results = {}
+        pending = []
+        for row_id, text_content in items:
+            if not text_content or len(text_content) < 50 or self.batch_size <= 1:
+                results[row_id] = self.analyze(text_content, client_description, tier)
+                continue
+            
+            text_content = self._pack_context(text_content, client_description, budget)
+            cached = self.cache.lookup(text_content, client_description, models) if self.cache else None
+            if cached is not None:
+                results[row_id] = cached
+            else:
+                pending.append((row_id, text_content))
+
+        for chunk in self._pack(pending, client_description):
+            if len(chunk) == 1:
+                row_id, text_content = chunk[0]
+                results[row_id] = self._analyze_single(text_content, client_description, tier)
+                continue
+            
+            answers = self._analyze_chunk(chunk, client_description, tier)
+            for row_id, text_content in chunk:
+                analysis = answers.get(str(row_id))
+                if analysis is None:
+                    self._bump_batch("fallbacks")
+                    analysis = self._analyze_single(text_content, client_description, tier)
+                results[row_id] = analysis
+
+        return results
+
+    def _pack(self, items, client_description):
+        """Agrupa empresas en lotes de como mucho batch_size y LLM_BATCH_TOKEN_BUDGET tokens de entrada."""
+        base_tokens = len(BATCH_PROMPT_TEMPLATE) // 4 + len(client_description) // 4
+        chunks, chunk, chunk_tokens = [], [], base_tokens
+        for row_id, text_content in items:
+            item_tokens = len(text_content) // 4 + 20
+            if chunk and (len(chunk) >= self.batch_size or chunk_tokens + item_tokens > config.LLM_BATCH_TOKEN_BUDGET):
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], base_tokens
+            chunk.append((row_id, text_content))
+            chunk_tokens += item_tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _analyze_chunk(self, chunk, client_description, tier="default"):
+        """Una petición para todo el lote. Devuelve {id (str): análisis válido}; lo demás se descarta."""
+        companies = "\n".join(
+            COMPANY_TEMPLATE.format(row_id=row_id, text_content=text_content) for row_id, text_content in chunk
+        )
+        prompt = BATCH_PROMPT_TEMPLATE.format(client_description=client_description, companies=companies)
+        tokens = estimate_tokens(prompt) + config.LLM_OUTPUT_TOKENS_ESTIMATE * (len(chunk) - 1)
+
+        model_name, elements = self._generate(
+            prompt, tokens, lambda text: json.loads(self._clean_json_array(text)), self._tier(tier)[0]
+        )
+        self._bump_batch("batches")
+        self._bump_batch("batched_items", len(chunk))
+        if not isinstance(elements, list):
+            return {}
+
+        texts = {str(row_id): text_content for row_id, text_content in chunk}
+        answers = {}
+        for element in elements:
+            row_id = str(element.get("id", "")).strip() if isinstance(element, dict) else ""
+            analysis = self._validate(element)
+            if row_id in texts and analysis is not None:
+                answers[row_id] = analysis
+                if self.cache:
+                    self.cache.save(texts[row_id], client_description, model_name, analysis)
+        return answers
+
+    def _pack_context(self, text_content, client_description, budget_chars=None):
+        """Recorta el texto al presupuesto de contexto quedándose con los pasajes más relevantes."""
+        packed, stats = pack_context(text_content, client_description, budget_chars)
+        with self._stats_lock:
+            self.context_stats["texts"] += 1
+            self.context_stats["packed"] += 1 if stats["passages"] else 0
+            self.context_stats["chars_in"] += stats["chars_in"]
+            self.context_stats["chars_out"] += stats["chars_out"]
+        return packed
+
+    def classify_rows(self, items, client_description):
+        """
+        Punto de entrada del orquestador. `items` = [(id_fila, texto)].
+        Devuelve {id_fila: (análisis, nivel)} donde nivel es "IA", o "IA (rápido)"/"IA (revisión)" en cascada.
+        """
+        if not self.cascade:
+            return {row_id: (analysis, "IA") for row_id, analysis in self.analyze_batch(items, client_description).items()}
+
+        # 1. Modelo barato con contexto reducido para todas las filas
+        results = {
+            row_id: (analysis, "IA (rápido)")
+            for row_id, analysis in self.analyze_batch(items, client_description, tier="fast").items()
+        }
+
+        # 2. Sólo las dudosas (confianza < umbral de revisión) vuelven con el modelo fuerte y más contexto
+        review = [
+            (row_id, text_content) for row_id, text_content in items
+            if text_content and len(text_content) >= 50
+            and self._confidence(results[row_id][0]) < config.REVIEW_CONFIDENCE_THRESHOLD
+        ]
+        self._bump_cascade("rows", len(items))
+        self._bump_cascade("escalated", len(review))
+        if review:
+            for row_id, analysis in self.analyze_batch(review, client_description, tier="strong").items():
+                if analysis.get("reasoning") == FAILED_RESULT["reasoning"]:
+                    self._bump_cascade("strong_failed") # nos quedamos con el veredicto rápido
+                    continue
+                results[row_id] = (analysis, "IA (revisión)")
+        return results
+
+    @staticmethod
+    def _confidence(analysis):
+        """confidence_score como número (las respuestas sueltas no se validan y a veces llega como texto)."""
+        try:
+            return float(analysis.get("confidence_score", 0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _bump_cascade(self, key, amount=1):
+        with self._stats_lock:
+            self.cascade_stats[key] += amount
+
+    def _bump_batch(self, key, amount=1):
+        with self._stats_lock:
+            self.batch_stats[key] += amount
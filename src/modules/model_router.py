@@ -0,0 +1,101 @@
+import time
+import threading
+
+from core import config
+from modules.llm_dispatcher import is_quota_error
+
+
+class ModelRouter:
+    """
+    Salud de los modelos durante la ejecución.
+    - Reutiliza una instancia por modelo (no se crea un GenerativeModel por fila).
+    - Circuit breaker: tras un 404 o varios 429 seguidos el modelo se aparta durante un tiempo.
+    - Ordena los candidatos por tasa de éxito y latencia reciente (a igualdad, el orden de config.LLM_MODELS).
+    """
+
+    def __init__(self, factory, models=None):
+        self.factory = factory  # p.ej. genai.GenerativeModel
+        self.models = list(models or config.LLM_MODELS)
+        self._instances = {}
+        self._lock = threading.Lock()
+        self._health = {name: self._new_health() for name in self.models}
+
+    @staticmethod
+    def _new_health():
+        return {
+            "calls": 0, "ok": 0, "errors": 0, "quota_errors": 0, "not_found": 0,
+            "consecutive_quota": 0, "latency_ewma": None, "cooldown_until": 0.0, "cooldowns": 0
+        }
+
+    def model(self, name):
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self.factory(name)
+            return self._instances[name]
+
+    def _sort_key(self, name, preference):
+        health = self._health[name]
+        # Éxito suavizado (un modelo sin historial parte de 1.0) en tramos de 10 %
+        success_rate = (health["ok"] + 1) / (health["calls"] + 1)
+        latency = health["latency_ewma"] or 0.0
+        return (-round(success_rate, 1), round(latency / config.LLM_LATENCY_BUCKET), preference.index(name))
+
+    def candidates(self, models=None):
+        """Modelos disponibles (fuera de cooldown) de `models` (por defecto todos), del más prometedor al menos."""
+        preference = list(models or self.models)
+        now = time.monotonic()
+        with self._lock:
+            for name in preference:
+                self._health.setdefault(name, self._new_health())
+            available = [name for name in preference if self._health[name]["cooldown_until"] <= now]
+            return sorted(available, key=lambda name: self._sort_key(name, preference))
+
+    def record_success(self, name, latency):
+        with self._lock:
+            health = self._health[name]
+            health["calls"] += 1
+            health["ok"] += 1
+            health["consecutive_quota"] = 0
+            previous = health["latency_ewma"]
+            alpha = config.LLM_LATENCY_ALPHA
+            health["latency_ewma"] = latency if previous is None else alpha * latency + (1 - alpha) * previous
+
+    def record_failure(self, name, error):
+        """Clasifica el error y, si toca, abre el circuito del modelo durante un cooldown."""
+        with self._lock:
+            health = self._health[name]
+            health["calls"] += 1
+            health["errors"] += 1
+            cooldown = 0
+
+            if "404" in str(error):
+                health["not_found"] += 1
+                cooldown = config.LLM_NOT_FOUND_COOLDOWN
+            elif is_quota_error(error):
+                health["quota_errors"] += 1
+                health["consecutive_quota"] += 1
+                if health["consecutive_quota"] >= config.LLM_QUOTA_STRIKES:
+                    cooldown = config.LLM_QUOTA_COOLDOWN
+                    health["consecutive_quota"] = 0
+
+            if cooldown:
+                health["cooldown_until"] = time.monotonic() + cooldown
+                health["cooldowns"] += 1
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for name in self._health:
+                health = self._health[name]
+                stats[name] = {
+                    "calls": health["calls"],
+                    "ok": health["ok"],
+                    "success_rate": round(health["ok"] / health["calls"], 3) if health["calls"] else None,
+                    "avg_latency_s": round(health["latency_ewma"], 2) if health["latency_ewma"] is not None else None,
+                    "quota_errors": health["quota_errors"],
+                    "not_found": health["not_found"],
+                    "cooldowns": health["cooldowns"],
+                    "available": health["cooldown_until"] <= now
+                }
+            return stats
@@ -0,0 +1,78 @@
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def host_of(url):
+    """Devuelve el host (sin 'www.') de una URL, aunque venga sin esquema."""
+    url = str(url or '').strip()
+    if not url.startswith('http'):
+        url = f'https://{url}'
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        host = ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def interleave_by_host(items, key=lambda item: item):
+    """
+    Reordena los trabajos en round-robin por host.
+    Así los hilos no se quedan esperando todos al mismo dominio (p.ej. filiales con la misma web).
+    """
+    buckets = {}
+    for item in items:
+        buckets.setdefault(host_of(key(item)), []).append(item)
+
+    queues = list(buckets.values())
+    ordered = []
+    while queues:
+        for q in queues:
+            ordered.append(q.pop(0))
+        queues = [q for q in queues if q]
+    return ordered
+
+
+class HostLimiter:
+    """
+    Cortesía por dominio: como mucho `max_per_host` peticiones simultáneas a un mismo host
+    y, opcionalmente, una separación mínima (segundos) entre dos arranques consecutivos.
+    """
+
+    def __init__(self, max_per_host=2, min_interval=0.0):
+        self.max_per_host = max(1, int(max_per_host))
+        self.min_interval = float(min_interval or 0)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._last_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    def _wait_interval(self, host):
+        if self.min_interval <= 0:
+            return
+        while True:
+            with self._lock:
+                elapsed = time.monotonic() - self._last_start.get(host, 0.0)
+                if elapsed >= self.min_interval:
+                    self._last_start[host] = time.monotonic()
+                    return
+                remaining = self.min_interval - elapsed
+            time.sleep(remaining)
+
+    @contextmanager
+    def slot(self, url):
+        """Bloquea hasta que haya hueco para el host de `url`."""
+        host = host_of(url)
+        semaphore = self._semaphore(host)
+        semaphore.acquire()
+        try:
+            self._wait_interval(host)
+            yield host
+        finally:
+            semaphore.release()
@@ -0,0 +1,196 @@
+import re
+import threading
+
+from core import config
+
+
+# Cola de la frase: lo que sigue a la señal hasta fin de frase (máx. 60 caracteres)
+_TAIL = r"[^\n.;:|]{2,60}"
+
+# Nombre propio de un grupo ("Grupo Acme", "grupo ACS"): empieza por mayúscula o cifra (sin
+# ignorar mayúsculas) y no es un "grupo de trabajo/asesores/empresas..." genérico
+_GENERIC_GROUP = (
+    r"(?:de|del|of|trabajo|asesores|empresas|expertos|profesionales|colaboradores|investigación"
+    r"|interés|compra|whatsapp|facebook|linkedin)\b"
+)
+_NAMED = rf"(?!{_GENERIC_GROUP})(?-i:[A-ZÁÉÍÓÚÑ0-9][\w&'.-]*)[^\n.;:|]{{0,60}}"
+# Inicio de oración o cláusula: las reglas de filial exigen que el sujeto sea la propia empresa
+# ("somos filial de...", "Acme S.L. es una filial de..."), no sus clientes ("si su empresa es filial...")
+_START = r"(?:^|(?<=[\n.;:!?|,(]))\s*"
+# Nombre propio justo antes del verbo ("Acme Consulting es..."), que no sea un posesivo o conjunción
+_SUBJECT = (
+    r"(?!(?:Si|Su|Sus|Tu|Tus|Cuando|Usted|If|Your|When|Votre|Vos|Ihr|Ihre|Wenn)\b)"
+    r"(?-i:[A-ZÁÉÍÓÚÑÄÖÜ][\w&'.-]*(?: [A-ZÁÉÍÓÚÑÄÖÜ&][\w&'.-]*){0,4})"
+)
+# Nombre corporativo en inglés: 1-4 palabras en mayúscula que no sean de una asociación profesional
+_CORPORATE = (
+    r"(?!(?:Institute|Association|Chamber|Council|Society|Federation|Network)\b)"
+    r"(?-i:[A-Z][\w&'.-]*(?: [A-Z][\w&'.-]*){0,3})"
+)
+
+# (nombre de la regla, confianza, patrón). Sólo frases explícitas: ante la duda decide el LLM.
+# Las reglas por debajo de PRECLASSIFIER_MIN_CONFIDENCE no deciden solas (quedan para el LLM).
+GROUP_RULES = [
+    ("es_filial_de", 95, (
+        rf"{_START}(?:(?:nosotros )?somos (?:una |la )?|{_SUBJECT} es (?:una |la ))"
+        rf"(?:filial|subsidiaria|sociedad participada) de(?:l)? {_TAIL}"
+    )),
+    ("es_pertenece_grupo", 95, rf"\b(?:pertenece|pertenecemos|forma parte|formamos parte|integrad[ao]s?) (?:a|al|del|de la|en el) grupo {_NAMED}"),
+    ("es_empresa_del_grupo", 90, rf"\buna empresa del grupo {_NAMED}"),
+    ("es_nuestras_filiales", 90, (
+        r"\b(?:nuestras (?:filiales|sociedades filiales)|nuestra (?:sociedad )?(?:matriz|holding))\b"
+        r"(?! (?:clientes?|de clientes|que asesoramos))[^\n.;:|]{0,60}"
+    )),
+    ("en_subsidiary_of", 95, (
+        rf"{_START}(?:we are|{_SUBJECT} is) an? (?:wholly[- ]owned )?subsidiary of {_TAIL}"
+    )),
+    ("en_part_of_group", 95, rf"\b(?:part|member) of the {_CORPORATE} (?-i:Group)\b"),
+    ("en_group_company", 90, rf"\ba {_CORPORATE} [Gg]roup company\b"),
+    ("en_our_subsidiaries", 90, (
+        r"\bour (?:subsidiaries|parent company|holding company)\b"
+        r"(?! (?:clients?|customers?|services?|that we))[^\n.;:|]{0,60}"
+    )),
+    ("fr_filiale", 95, (
+        rf"{_START}(?:(?:nous sommes une |{_SUBJECT} est une )filiale (?:du groupe|de) {_TAIL}"
+        rf"|filiale du groupe {_NAMED})"
+    )),
+    ("de_tochter", 95, (
+        rf"{_START}(?:wir sind eine |{_SUBJECT} ist eine )tochter(?:gesellschaft|unternehmen) de[rs] {_TAIL}"
+    )),
+    ("it_gruppo", 95, rf"\b(?:fa parte del|appartiene al) gruppo {_NAMED}"),
+    ("pt_grupo", 95, rf"\b(?:subsidiária|filial) d[oa] grupo {_NAMED}"),
+]
+
+MANUFACTURER_RULES = [
+    ("es_planta", 95, r"\b(?:nuestras?|(?:contamos con|disponemos de) (?:una |dos |tres |varias |\d+ )?)plantas? (?:de producción|de fabricación|industrial(?:es)?)\b[^\n.;:|]{0,60}"),
+    # "Fabricamos software a medida": el verbo solo no basta, lo decide el LLM
+    ("es_fabricamos", 80, rf"\b(?:fabricamos|diseñamos y fabricamos|producimos y comercializamos) {_TAIL}"),
+    ("es_fabricante", 90, rf"\b(?:somos|es) (?:un |una )?(?:fabricante|empresa fabricante) de {_TAIL}"),
+    ("en_we_manufacture", 80, rf"\bwe (?:design and )?manufacture {_TAIL}"),
+    ("en_plant", 95, r"\bour (?:own )?(?:manufacturing|production) (?:plant|facility|facilities|site)s?\b[^\n.;:|]{0,60}"),
+    ("fr_usine", 90, r"\b(?:notre|nos) usines?\b[^\n.;:|]{0,60}"),
+    ("de_produktion", 90, r"\b(?:produktionsstätte|produktionswerk|wir produzieren|wir fertigen)\b[^\n.;:|]{0,60}"),
+    ("it_stabilimento", 90, r"\bstabiliment[oi] (?:produttiv[oi]|di produzione)\b[^\n.;:|]{0,60}"),
+    ("pt_fabrica", 90, rf"\b(?:nossa fábrica|unidade fabril) {_TAIL}"),
+]
+
+# Frases de referencia (texto, regla que debe resolver la fila o None): las negativas son el
+# lenguaje de asesorías y gestorías que hablan de sus clientes. Se comprueban con
+# `python -m modules.pre_classifier` desde src/ tras tocar cualquier patrón.
+RULE_EXAMPLES = [
+    ("Somos una filial del Grupo Acme desde 2010.", "es_filial_de"),
+    ("Acme Consulting S.L. es una filial de Beta Holding.", "es_filial_de"),
+    ("Pertenecemos al Grupo Eulen.", "es_pertenece_grupo"),
+    ("Una empresa del Grupo Acme", "es_empresa_del_grupo"),
+    ("Contamos con nuestras filiales en Portugal y México.", "es_nuestras_filiales"),
+    ("We are a wholly-owned subsidiary of Acme Holdings Ltd.", "en_subsidiary_of"),
+    ("Acme Services Ltd is a subsidiary of Beta plc.", "en_subsidiary_of"),
+    ("We are part of the Acme Group.", "en_part_of_group"),
+    ("Our subsidiaries in France and Italy.", "en_our_subsidiaries"),
+    ("Nous sommes une filiale du groupe Bolloré.", "fr_filiale"),
+    ("Filiale du groupe Bolloré", "fr_filiale"),
+    ("Wir sind eine Tochtergesellschaft der Acme AG.", "de_tochter"),
+    ("Contamos con una planta de producción en Zaragoza.", "es_planta"),
+    ("Somos un fabricante de maquinaria agrícola.", "es_fabricante"),
+    ("Services to the Spanish subsidiary of foreign groups.", None),
+    ("Si su empresa es filial de un grupo extranjero, le ayudamos con los precios de transferencia.", None),
+    ("Asesoramos a clientes como filial de multinacionales.", None),
+    ("Nous vous accompagnons dans la création de votre filiale de distribution.", None),
+    ("Gründung einer Tochtergesellschaft der Muttergesellschaft.", None),
+    ("Gestionamos la contabilidad de nuestras filiales clientes.", None),
+    ("Our parent company clients rely on us for payroll.", None),
+    ("Somos un grupo de asesores fiscales.", None),
+    ("Fabricamos soluciones de software a medida.", None),
+]
+
+
+def _compile(rules):
+    return [(name, confidence, re.compile(pattern, re.IGNORECASE)) for name, confidence, pattern in rules]
+
+
+class PreClassifier:
+    """
+    Pre-clasificación determinista entre el scraping y el LLM.
+    Si el texto dice explícitamente que la empresa es filial/de un grupo o que fabrica,
+    la fila se rechaza igual diga lo que diga la IA: devolvemos el mismo esquema que
+    LLMEngine.analyze con la frase literal como evidence_quote y nos ahorramos la llamada.
+    """
+
+    def __init__(self, min_confidence=None):
+        self.min_confidence = config.PRECLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.group_rules = _compile(GROUP_RULES)
+        self.manufacturer_rules = _compile(MANUFACTURER_RULES)
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "resolved": 0, "by_rule": {}}
+
+    @staticmethod
+    def _first_match(rules, text):
+        """Regla más fiable que casa (y su coincidencia) o (None, None)."""
+        best = (None, None)
+        for name, confidence, pattern in rules:
+            match = pattern.search(text)
+            if match and (best[0] is None or confidence > best[0][1]):
+                best = ((name, confidence), match)
+        return best
+
+    def classify(self, text_content):
+        """Devuelve un análisis con el esquema del LLM o None si las reglas no son concluyentes."""
+        text_content = text_content or ""
+        group = self._first_match(self.group_rules, text_content)
+        manufacturer = self._first_match(self.manufacturer_rules, text_content)
+        is_group = group[0] is not None and group[0][1] >= self.min_confidence
+        is_manufacturer = manufacturer[0] is not None and manufacturer[0][1] >= self.min_confidence
+        hits = [hit for hit, flag in ((group, is_group), (manufacturer, is_manufacturer)) if flag]
+
+        with self._lock:
+            self.stats["checked"] += 1
+            if not hits:
+                return None
+            self.stats["resolved"] += 1
+            for (name, _), _ in hits:
+                self.stats["by_rule"][name] = self.stats["by_rule"].get(name, 0) + 1
+
+        (name, confidence), match = max(hits, key=lambda hit: hit[0][1])
+        motivo = " y ".join(
+            label for flag, label in ((is_group, "pertenece a un grupo"), (is_manufacturer, "es fabricante")) if flag
+        )
+        return {
+            "is_group": is_group,
+            "is_manufacturer": is_manufacturer,
+            "service_match": True,
+            # Criterios que las reglas no han mirado (la fila se rechaza igual): en el Excel van
+            # como "No evaluado", no como un "NO" con la confianza de la regla
+            "not_assessed": ["service_match"] + [
+                key for key, flag in (("is_group", is_group), ("is_manufacturer", is_manufacturer)) if not flag
+            ],
+            "reasoning": f"Regla determinista ({name}): el texto indica que {motivo}.",
+            "evidence_quote": " ".join(match.group(0).split()),
+            "confidence_score": confidence
+        }
+
+    def explain(self, text_content):
+        """Nombre de la regla que resuelve el texto (la de más confianza) o None."""
+        hits = [
+            self._first_match(rules, text_content or "")[0]
+            for rules in (self.group_rules, self.manufacturer_rules)
+        ]
+        hits = [hit for hit in hits if hit is not None and hit[1] >= self.min_confidence]
+        return max(hits, key=lambda hit: hit[1])[0] if hits else None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, by_rule=dict(self.stats["by_rule"]))
+        stats["skip_rate"] = round(stats["resolved"] / stats["checked"], 3) if stats["checked"] else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    classifier = PreClassifier()
+    failures = 0
+    for text, expected in RULE_EXAMPLES:
+        got = classifier.explain(text)
+        if got != expected:
+            failures += 1
+            print(f"❌ {text!r}: esperado {expected}, obtenido {got}")
+    print(f"✅ {len(RULE_EXAMPLES) - failures}/{len(RULE_EXAMPLES)} frases de referencia correctas")
+    raise SystemExit(1 if failures else 0)
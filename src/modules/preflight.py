@@ -0,0 +1,78 @@
+import os
+import socket
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from core import config
+
+
+def probe_target(url):
+    """
+    (host, puerto) que abrirá realmente el scraper para una URL del Excel: el host tal cual,
+    con su 'www.' (muchas pymes sólo publican el registro DNS de www), y el puerto explícito
+    si lo hay (None = los de PREFLIGHT_PORTS). No usar host_of: ese es sólo para la cortesía.
+    """
+    url = str(url or '').strip()
+    if not url.startswith('http'):
+        url = f'https://{url}'
+    try:
+        parsed = urlparse(url)
+        return (parsed.hostname or '').lower(), parsed.port
+    except ValueError:
+        return '', None
+
+
+def probe_host(host, ports=None, timeout=None):
+    """
+    Comprueba que un host resuelve por DNS y acepta conexiones TCP (443/80).
+    Devuelve {"alive": bool, "reason": None | "dns" | "tcp", "port": int | None}.
+    """
+    ports = ports or config.PREFLIGHT_PORTS
+    timeout = timeout or config.PREFLIGHT_TIMEOUT
+
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return {"alive": False, "reason": "dns", "port": None}
+
+    # Probamos como mucho 2 direcciones distintas (IPv4/IPv6) por puerto
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))[:2]
+    for port in ports:
+        for address in addresses:
+            try:
+                with socket.create_connection((address, port), timeout=timeout):
+                    return {"alive": True, "reason": None, "port": port}
+            except OSError:
+                continue
+
+    return {"alive": False, "reason": "tcp", "port": None}
+
+
+def preflight_hosts(targets, max_workers=None):
+    """
+    Prueba todos los destinos (host, puerto) de probe_target en paralelo (pool de hilos acotado).
+    Devuelve {destino: resultado}.
+    Si no se puede confiar en la prueba (proxy, firewall) devuelve {} y no se descarta nada.
+    """
+    targets = [t for t in dict.fromkeys(targets) if t and t[0]]
+    if not targets:
+        return {}
+
+    # Detrás de un proxy la conexión directa no es representativa de lo que verá el navegador
+    if any(os.environ.get(var) for var in ("HTTPS_PROXY", "https_proxy", "HTTP_PROXY", "http_proxy")):
+        print("⚠️ Pre-chequeo omitido: hay un proxy configurado.")
+        return {}
+
+    def probe(target):
+        host, port = target
+        return probe_host(host, ports=[port] if port else None)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers or config.PREFLIGHT_WORKERS, len(targets))) as executor:
+        results = dict(zip(targets, executor.map(probe, targets)))
+
+    # Red restringida: si no contesta absolutamente nadie, el problema es nuestro, no de las webs
+    if len(results) >= 3 and not any(r["alive"] for r in results.values()):
+        print("⚠️ Pre-chequeo: ningún host responde, se asume red restringida y no se descarta nada.")
+        return {}
+
+    return results
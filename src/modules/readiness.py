@@ -0,0 +1,74 @@
+import time
+
+from core import config
+
+
+# Espera dentro del navegador hasta que el texto visible deja de cambiar.
+# El MutationObserver sólo marca "sucio"; el innerText (caro) se mide como mucho cada poll_ms.
+QUIET_WINDOW_JS = r"""
+({quiet_ms, max_ms, min_chars, poll_ms}) => new Promise((resolve) => {
+    const start = performance.now();
+    const textLength = () => (document.body ? document.body.innerText.length : 0);
+
+    let dirty = false;
+    let lastLength = textLength();
+    let lastChange = start;
+
+    const observer = new MutationObserver(() => { dirty = true; });
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+
+    const timer = setInterval(() => {
+        const now = performance.now();
+        if (dirty) {
+            dirty = false;
+            const length = textLength();
+            if (length !== lastLength) {
+                lastLength = length;
+                lastChange = now;
+            }
+        }
+
+        const quiet = lastLength >= min_chars && now - lastChange >= quiet_ms;
+        if (quiet || now - start >= max_ms) {
+            clearInterval(timer);
+            observer.disconnect();
+            resolve({waited_ms: Math.round(now - start), reason: quiet ? 'quiet' : 'max', text_length: lastLength});
+        }
+    }, poll_ms);
+})
+"""
+
+# Dos frames: suficiente para que se pinten los cambios inyectados (highlight, banner)
+NEXT_PAINT_JS = "() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))"
+
+
+def wait_until_ready(page, mode):
+    """
+    Espera a que la página esté lista según la estrategia del modo ('scrape', 'deep', 'screenshot').
+    Devuelve {"mode", "waited_ms", "reason"} para poder afinar los topes con datos reales.
+    """
+    strategy = config.READINESS.get(mode) or config.READINESS["scrape"]
+    started = time.monotonic()
+
+    if strategy.get("strategy") == "fixed":
+        page.wait_for_timeout(strategy["max_ms"])
+        return {"mode": mode, "waited_ms": int((time.monotonic() - started) * 1000), "reason": "fixed"}
+
+    try:
+        info = page.evaluate(QUIET_WINDOW_JS, strategy)
+        return {"mode": mode, "waited_ms": info["waited_ms"], "reason": info["reason"]}
+    except Exception:
+        # Típico: una redirección por JS destruye el contexto de ejecución a mitad de la espera
+        try:
+            page.wait_for_load_state("domcontentloaded", timeout=strategy["max_ms"])
+        except Exception:
+            pass
+        return {"mode": mode, "waited_ms": int((time.monotonic() - started) * 1000), "reason": "navigation"}
+
+
+def wait_for_paint(page):
+    """Espera a que el navegador pinte los cambios del DOM antes de una captura."""
+    try:
+        page.evaluate(NEXT_PAINT_JS)
+    except Exception:
+        pass
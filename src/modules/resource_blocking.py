@@ -0,0 +1,64 @@
+from urllib.parse import urlparse
+
+from core import config
+
+
+def _is_tracker(host):
+    """True si el host (o un subdominio suyo) pertenece a la lista de publicidad/analítica."""
+    if not host:
+        return False
+    for blocked in config.TRACKER_HOSTS:
+        if host == blocked or host.endswith("." + blocked):
+            return True
+    return False
+
+
+def keeps_visuals(profile_name):
+    """True si el perfil deja pasar imágenes, fuentes y vídeo (una copia de la página sirve de evidencia)."""
+    profile = config.RESOURCE_PROFILES.get(profile_name) or config.RESOURCE_PROFILES["full"]
+    return not set(profile.get("block_types", [])) & {"image", "media", "font", "stylesheet"}
+
+
+def apply_resource_profile(context, profile_name):
+    """
+    Instala un route("**/*") en el contexto que aborta los recursos del perfil.
+    Devuelve un dict de contadores que se va rellenando mientras navega la página.
+    """
+    profile = config.RESOURCE_PROFILES.get(profile_name) or config.RESOURCE_PROFILES["full"]
+    block_types = set(profile.get("block_types", []))
+    block_trackers = profile.get("block_trackers", False)
+
+    counters = {
+        "profile": profile_name,
+        "requests_allowed": 0,
+        "requests_blocked": 0,
+        "bytes_saved_est": 0,
+        "blocked_by_reason": {}
+    }
+
+    # Perfil de fidelidad completa: no interceptamos nada (cero overhead)
+    if not block_types and not block_trackers:
+        return counters
+
+    def handler(route):
+        request = route.request
+        reason = None
+
+        if request.resource_type in block_types:
+            reason = request.resource_type
+        elif block_trackers:
+            if _is_tracker(urlparse(request.url).hostname):
+                reason = "tracker"
+
+        if reason is None:
+            counters["requests_allowed"] += 1
+            route.continue_()
+            return
+
+        counters["requests_blocked"] += 1
+        counters["bytes_saved_est"] += config.BLOCKED_BYTES_ESTIMATE.get(reason, 0)
+        counters["blocked_by_reason"][reason] = counters["blocked_by_reason"].get(reason, 0) + 1
+        route.abort("blockedbyclient")
+
+    context.route("**/*", handler)
+    return counters
@@ -0,0 +1,155 @@
+import os
+import csv
+import json
+from datetime import date, datetime, time
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from core import config
+
+
+def _cell(value):
+    """Valor apto para openpyxl: NaN/None -> celda vacía y sin caracteres de control (rompen el .xlsx)."""
+    if value is None:
+        return None
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+
+# Tipos que JSON no tiene (fechas del Excel de entrada): en el volcado van con etiqueta
+# {"$datetime": "..."} y se restauran al escribir el .xlsx, que los guarda como fechas de verdad
+_TAGGED = {"$datetime": datetime, "$date": date, "$time": time}
+
+
+def _encode(value):
+    for tag, kind in _TAGGED.items():
+        if isinstance(value, kind):  # datetime antes que date: es subclase suya
+            return {tag: value.isoformat()}
+    return str(value)
+
+
+def _decode(value):
+    if isinstance(value, dict) and len(value) == 1:
+        tag, text = next(iter(value.items()))
+        if tag in _TAGGED:
+            return _TAGGED[tag].fromisoformat(text)
+    return value
+
+
+def _save_workbook(path, columns, rows, sheet_name="Sheet1"):
+    """
+    Escribe el .xlsx en modo write-only (fila a fila, sin modelo de celdas en memoria).
+    Las cadenas que empiezan por '=' (los HYPERLINK de evidencia) se guardan como fórmulas.
+    Se escribe en un temporal y se renombra: quien abra el fichero nunca ve uno a medias.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+
+    temp_path = f"{path}.tmp"
+    workbook.save(temp_path)
+    os.replace(temp_path, path)
+
+
+def write_xlsx(path, dataframe):
+    """Guarda un dataframe con el mismo escritor (orden de columnas y fórmulas intactos)."""
+    _save_workbook(path, list(dataframe.columns), dataframe.itertuples(index=False, name=None))
+
+
+class ResultSink:
+    """
+    Salida incremental de resultados. Las filas llegan ya en el orden del Excel y se añaden
+    (sólo append, sin reescribir nada) a un fichero de volcado <salida>.partial.jsonl (primera
+    línea: las columnas) y, si sidecar = "csv" (por defecto), al CSV: el resultado parcial se
+    puede abrir durante la ejecución, sobrevive a un corte y las filas no se quedan en memoria.
+    El .xlsx se escribe una sola vez, al cerrar, leyendo el volcado en streaming (modo write-only).
+    """
+
+    def __init__(self, path, columns, sidecar=None):
+        self.path = path
+        self.columns = list(columns)
+        self.sidecar = sidecar if sidecar is not None else config.RESULTS_SIDECAR
+        self.sidecar_path = f"{os.path.splitext(path)[0]}.{self.sidecar}" if self.sidecar else None
+        self.spill_path = f"{os.path.splitext(path)[0]}.partial.jsonl"
+        self.count = 0
+        self.updates = {}  # {posición: {columna: valor}} cambios posteriores (evidencias diferidas)
+        self._spill = open(self.spill_path, "w", encoding="utf-8")
+        self._spill.write(json.dumps(self.columns, ensure_ascii=False) + "\n")
+        self._csv_file = None
+        self._csv = None
+        if self.sidecar == "csv":
+            self._csv_file = open(self.sidecar_path, "w", newline="", encoding="utf-8-sig")
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(self.columns)
+
+    def write(self, values):
+        """Añade una fila (dict columna -> valor; las que falten quedan vacías)."""
+        row = [values.get(column, '') for column in self.columns]
+        self._spill.write(json.dumps(row, ensure_ascii=False, default=_encode) + "\n")
+        self._spill.flush()
+        if self._csv is not None:
+            self._csv.writerow(['' if _cell(value) is None else value for value in row])
+            self._csv_file.flush()
+        self.count += 1
+
+    def update(self, position, values):
+        """Cambia columnas de una fila ya escrita (se aplica al generar el .xlsx final)."""
+        self.updates.setdefault(position, {}).update(values)
+
+    def _rows(self):
+        """Filas del volcado, en orden, con los cambios posteriores aplicados."""
+        if not self._spill.closed:
+            self._spill.flush()
+        positions = {column: i for i, column in enumerate(self.columns)}
+        with open(self.spill_path, encoding="utf-8") as f:
+            next(f)  # cabecera
+            for position, line in enumerate(f):
+                row = [_decode(value) for value in json.loads(line)]
+                for column, value in self.updates.get(position, {}).items():
+                    row[positions[column]] = value
+                yield row
+
+    def dataframe(self):
+        """Dataframe de resultados (para la UI), construido de una vez a partir del volcado."""
+        return pd.DataFrame(list(self._rows()), columns=self.columns, dtype=object)
+
+    def close(self, dataframe=None):
+        """
+        Escribe el .xlsx final en streaming desde el volcado y el sidecar completo, y borra el volcado.
+        Parquet necesita el dataframe (`dataframe` o, si no se pasa, se construye).
+        """
+        self._spill.close()
+        _save_workbook(self.path, self.columns, self._rows())
+
+        if self.sidecar == "csv":
+            # Se reescribe para incluir los cambios posteriores (enlaces de evidencias diferidas)
+            self._csv_file.close()
+            with open(self.sidecar_path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.columns)
+                for row in self._rows():
+                    writer.writerow(['' if _cell(value) is None else value for value in row])
+        elif self.sidecar == "parquet":
+            # Parquet necesita tipos homogéneos por columna: las de objetos se guardan como texto
+            frame = self.dataframe() if dataframe is None else dataframe.copy()
+            for column in frame.columns:
+                if frame[column].dtype == object:
+                    frame[column] = frame[column].map(lambda value: '' if _cell(value) is None else str(value))
+            try:
+                frame.to_parquet(self.sidecar_path, index=False)
+            except ImportError as e:
+                print(f"⚠️ No se pudo escribir el Parquet (falta pyarrow/fastparquet): {e}")
+                self.sidecar_path = None
+
+        try:
+            os.remove(self.spill_path)
+        except OSError:
+            pass
+        return {"rows": self.count, "sidecar": self.sidecar_path}
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from core import config
+
+
+def row_fingerprint(row):
+    """Huella de una fila de entrada (sus columnas originales): la misma fila da la misma huella."""
+    payload = json.dumps(
+        {str(column): str(value) for column, value in row.items()}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    Diario de una ejecución en data/journal/<run_id>.jsonl: una línea por fila terminada
+    (huella de la fila de entrada + columnas calculadas + evidencia pendiente).
+    Se hace flush en cada línea y fsync por lotes (cada JOURNAL_FSYNC_EVERY filas o
+    JOURNAL_FSYNC_SECONDS s): si el proceso muere se pierden, como mucho, las últimas filas.
+    Al reanudar, las filas cuya huella ya está en el diario no se vuelven a procesar.
+    """
+
+    def __init__(self, run_id, directory=None, fsync_every=None, fsync_seconds=None):
+        self.run_id = run_id
+        self.directory = directory or config.JOURNAL_DIR
+        self.fsync_every = fsync_every or config.JOURNAL_FSYNC_EVERY
+        self.fsync_seconds = config.JOURNAL_FSYNC_SECONDS if fsync_seconds is None else fsync_seconds
+        self.path = os.path.join(self.directory, f"{run_id}.jsonl")
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self):
+        """{huella: entrada} de las filas ya terminadas. Ignora una última línea a medio escribir."""
+        completed = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("fingerprint"):
+                        completed[entry["fingerprint"]] = entry
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _write(self, entry):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                # Tras un corte la última línea puede haber quedado a medias: empezamos en una nueva
+                if self._file.tell() > 0 and not self._ends_with_newline():
+                    self._file.write("\n")
+            self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+
+    def append(self, fingerprint, row, values, evidence_job=None):
+        self._write({
+            "fingerprint": fingerprint, "row": row, "values": values, "evidence_job": evidence_job,
+            "at": datetime.now().isoformat(timespec="seconds")
+        })
+
+    def finish(self, file_path=None):
+        """Marca la ejecución como completa (ya no aparece entre las reanudables) y cierra el fichero."""
+        self._write({"finished": True, "file_path": file_path, "at": datetime.now().isoformat(timespec="seconds")})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def list_runs(directory=None, unfinished_only=True):
+        """Ejecuciones con diario, de la más reciente a la más antigua: [{"run_id", "rows", "finished"}]."""
+        directory = directory or config.JOURNAL_DIR
+        runs = []
+        try:
+            names = sorted(os.listdir(directory), reverse=True)
+        except FileNotFoundError:
+            return runs
+        for name in names:
+            if not name.endswith(".jsonl"):
+                continue
+            rows, finished = 0, False
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("finished"):
+                        finished = True
+                    elif entry.get("fingerprint"):
+                        rows += 1
+            if finished and unfinished_only:
+                continue
+            runs.append({"run_id": name[:-len(".jsonl")], "rows": rows, "finished": finished})
+        return runs
@@ -0,0 +1,70 @@
+import os
+import time
+
+from core import config
+from utils.helpers import normalize_url
+from utils.sqlite_cache import SQLiteCache
+
+
+def prune_snapshots(directory=None, ttl_hours=None):
+    """
+    Borra las instantáneas MHTML (y temporales huérfanos) más antiguas que el TTL de la caché
+    de scraping: ninguna entrada vigente puede apuntar ya a ellas. Sin TTL no se borra nada.
+    Devuelve cuántos ficheros se han borrado.
+    """
+    directory = directory or config.SNAPSHOT_DIR
+    ttl_hours = config.SCRAPE_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours
+    if not ttl_hours:
+        return 0
+
+    cutoff = time.time() - ttl_hours * 3600
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not (name.endswith(".mhtml") or name.endswith(".tmp")):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class ScrapeCache:
+    """
+    Caché persistente de resultados del scraper, indexada por URL normalizada.
+    Guarda el dict completo (incluido `url_evidencia`) para que las filas cacheadas
+    conserven su enlace de evidencia.
+    """
+
+    def __init__(self, path=None, ttl_hours=None, max_entries=None):
+        ttl_hours = config.SCRAPE_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours
+        self.store = SQLiteCache(
+            path or config.SCRAPE_CACHE_PATH,
+            table="scrape_results",
+            ttl_seconds=ttl_hours * 3600 if ttl_hours else None,
+            max_entries=max_entries or config.SCRAPE_CACHE_MAX_ENTRIES
+        )
+
+    @staticmethod
+    def is_cacheable(data):
+        """Sólo cacheamos respuestas reales (200 o junk); los timeouts/errores se reintentan."""
+        return data.get("status") == 200 or data.get("is_junk")
+
+    def get(self, url):
+        key = normalize_url(url)
+        return self.store.get(key) if key else None
+
+    def set(self, url, data):
+        key = normalize_url(url)
+        if key and self.is_cacheable(data):
+            self.store.set(key, data)
+
+    def stats(self):
+        return self.store.stats()
@@ -1,18 +1,147 @@
-import json
-import subprocess
 import os
-import sys
-from datetime import datetime
-from urllib.parse import urlparse
+import uuid
+import threading
+from contextlib import nullcontext
+
+from core import config
+from modules.worker_pool import WorkerPool
+from modules.politeness import HostLimiter
+from modules.static_fetcher import StaticFetcher
+from modules.scrape_cache import ScrapeCache, prune_snapshots
+from modules.evidence_store import EvidenceStore
 
 class Scraper:
-    def __init__(self):
+    def __init__(self, pool_size=None, max_per_host=None, scrape_profile=None, screenshot_profile=None,
+                 use_cache=True, refresh_cache=False):
         # Ruta al worker.py
         self.worker_path = os.path.join("src", "modules", "worker.py")
 
+        # Pool de workers persistentes (un Chromium por proceso, reutilizado entre URLs)
+        self.pool = WorkerPool(self.worker_path, size=pool_size or config.POOL_SIZE)
+        
+        # Cortesía por dominio: el límite global lo marca el tamaño del pool
+        self.host_limiter = HostLimiter(
+            max_per_host=max_per_host or config.MAX_PER_HOST,
+            min_interval=config.HOST_MIN_INTERVAL
+        )
+        
+        # Perfiles de bloqueo de recursos (ver config.RESOURCE_PROFILES)
+        self.scrape_profile = scrape_profile or config.SCRAPE_RESOURCE_PROFILE
+        self.screenshot_profile = screenshot_profile or config.SCREENSHOT_RESOURCE_PROFILE
+        
+        # Nivel 1 (HTTP plano): sólo escalamos a Chromium si la web lo necesita
+        self.static_fetcher = StaticFetcher() if config.STATIC_FETCH_ENABLED else None
+        
+        # Caché persistente de resultados (use_cache=False -> bypass total; refresh_cache -> no lee pero sí guarda)
+        self.cache = ScrapeCache() if use_cache else None
+        self.refresh_cache = refresh_cache
+        
+        # Capturas comprimidas y con nombre por hash (ver config.EVIDENCE_*)
+        self.evidence_store = EvidenceStore()
+        
+        # Métricas de la ejecución (qué nivel sirvió cada web y por qué se escaló)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "tiers": {"cache": 0, "static": 0, "browser": 0},
+            "escalations": {},
+            "blocking": {"requests_allowed": 0, "requests_blocked": 0, "bytes_saved_est": 0, "blocked_by_reason": {}},
+            "readiness": {},
+            "junk_rules": {},
+            "text": {"pages": 0, "chars_in": 0, "chars_out": 0},
+            "evidence": {"snapshots_captured": 0, "rendered_snapshot": 0, "rendered_live": 0, "deduped": 0, "bytes": 0}
+        }
+        
+        # Instantáneas caducadas (misma vida que la caché de scraping que las referencia)
+        self.stats["evidence"]["snapshots_pruned"] = prune_snapshots()
+
+    def _count(self, tier, escalation=None, blocking=None):
+        with self._stats_lock:
+            self.stats["tiers"][tier] += 1
+            if escalation:
+                self.stats["escalations"][escalation] = self.stats["escalations"].get(escalation, 0) + 1
+            if blocking:
+                totals = self.stats["blocking"]
+                for key in ("requests_allowed", "requests_blocked", "bytes_saved_est"):
+                    totals[key] += blocking.get(key, 0)
+                for reason, n in blocking.get("blocked_by_reason", {}).items():
+                    totals["blocked_by_reason"][reason] = totals["blocked_by_reason"].get(reason, 0) + n
+
+    def _count_junk(self, data):
+        """Qué regla de junk saltó y en qué fase (redirect/headers = sin esperar al DOM)."""
+        verdict = data.get("junk_rule")
+        if verdict:
+            key = f"{verdict['stage']}:{verdict['rule']}"
+            with self._stats_lock:
+                self.stats["junk_rules"][key] = self.stats["junk_rules"].get(key, 0) + 1
+
+    def _count_text(self, data):
+        """Acumula cuánto texto se ahorra la limpieza de boilerplate antes de llegar al LLM."""
+        text_stats = data.get("text_stats")
+        if text_stats:
+            with self._stats_lock:
+                totals = self.stats["text"]
+                totals["pages"] += 1
+                totals["chars_in"] += text_stats["chars_in"]
+                totals["chars_out"] += text_stats["chars_out"]
+
+    def _count_evidence(self, key, amount=1):
+        with self._stats_lock:
+            self.stats["evidence"][key] += amount
+
+    def _count_readiness(self, entries):
+        """Acumula las esperas reales por modo (scrape/deep/screenshot) para afinar los topes."""
+        with self._stats_lock:
+            for entry in entries or []:
+                agg = self.stats["readiness"].setdefault(
+                    entry.get("mode", "?"), {"count": 0, "total_ms": 0, "max_ms": 0, "hit_cap": 0}
+                )
+                agg["count"] += 1
+                agg["total_ms"] += entry.get("waited_ms", 0)
+                agg["max_ms"] = max(agg["max_ms"], entry.get("waited_ms", 0))
+                if entry.get("reason") == "max":
+                    agg["hit_cap"] += 1
+
+    def get_stats(self):
+        """Resumen de niveles para el informe final (incluye % de acierto del fast path)."""
+        with self._stats_lock:
+            tiers = dict(self.stats["tiers"])
+            escalations = dict(self.stats["escalations"])
+            blocking = dict(self.stats["blocking"], blocked_by_reason=dict(self.stats["blocking"]["blocked_by_reason"]))
+            readiness = {
+                mode: {**agg, "avg_ms": round(agg["total_ms"] / agg["count"]) if agg["count"] else 0}
+                for mode, agg in self.stats["readiness"].items()
+            }
+            junk_rules = dict(self.stats["junk_rules"])
+            text = dict(self.stats["text"])
+            evidence = dict(self.stats["evidence"])
+        text["reduction_ratio"] = round(1 - text["chars_out"] / text["chars_in"], 3) if text["chars_in"] else 0.0
+        fetched = tiers["static"] + tiers["browser"]
+        return {
+            "tiers": tiers,
+            "static_hit_rate": round(tiers["static"] / fetched, 3) if fetched else 0.0,
+            "cache": self.cache.stats() if self.cache else None,
+            "escalations": escalations,
+            "blocking": blocking,
+            "readiness": readiness,
+            "junk_rules": junk_rules,
+            "text": text,
+            "evidence": evidence
+        }
+
+    def _save_to_cache(self, url, data):
+        if self.cache:
+            try:
+                self.cache.set(url, data)
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar en caché {url}: {e}")
+
+    def close(self):
+        """Libera los procesos worker (se relanzan solos si se vuelve a usar el scraper)."""
+        self.pool.close()
+
     def extract_text(self, url):
         """
-        Lanza un subproceso aislado para evitar choques con Streamlit.
+        Envía la URL a un worker del pool (proceso aislado para evitar choques con Streamlit).
         """
         print(f"🕷️ Scraping: {url}")
         
@@ -22,40 +151,62 @@ class Scraper:
             "is_junk": False, 
             "text_content": "", 
             "error_msg": "", 
-            "url_evidencia": url # Si falla, la evidencia es la URL original
+            "url_evidencia": url, # Si falla, la evidencia es la URL original
+            "tier": "browser"
         }
 
+        # Nivel 0: caché local (la misma web ya se scrapeó en otra ejecución)
+        if self.cache and not self.refresh_cache:
+            cached = self.cache.get(url)
+            if cached:
+                self._count("cache")
+                cached["tier"] = "cache"
+                return cached
+
         try:
-            # Ejecutamos worker.py como un proceso independiente
-            result = subprocess.run(
-                [sys.executable, self.worker_path, str(url)],
-                capture_output=True,
-                text=True,
-                encoding='utf-8' 
-            )
+            escalation = None
+            with self.host_limiter.slot(url):
+                # Nivel 1: GET plano + parser HTML. Si basta, nos ahorramos Chromium.
+                if self.static_fetcher:
+                    data, escalation = self.static_fetcher.fetch(url)
+                    if data:
+                        self._count("static")
+                        self._count_junk(data)
+                        self._count_text(data)
+                        self._save_to_cache(url, data)
+                        return data
+                
+                # Nivel 2: Playwright en el pool de workers
+                reply = self.pool.request(
+                    "scrape", {"url": str(url), "profile": self.scrape_profile}, timeout=config.SCRAPE_JOB_TIMEOUT
+                )
             
-            if result.returncode != 0:
-                error_response["error_msg"] = f"Worker Failed: {result.stderr}"
+            if not reply.get("ok"):
+                self._count("browser", escalation)
+                error_response["error_msg"] = f"Worker Failed: {reply.get('error')}"
                 return error_response
             
-            # Parseamos el JSON que nos devuelve el worker
-            try:
-                data = json.loads(result.stdout)
-                return data
-            except json.JSONDecodeError:
-                error_response["error_msg"] = "Invalid JSON from worker"
-                # Opcional: imprimir stdout para debug
-                print(f"DEBUG WORKER STDOUT: {result.stdout}")
-                return error_response
+            data = reply["result"]
+            self._count("browser", escalation, data.get("blocking"))
+            self._count_readiness(data.get("readiness"))
+            self._count_junk(data)
+            self._count_text(data)
+            if data.get("snapshot_path"):
+                self._count_evidence("snapshots_captured")
+            data["tier"] = "browser"
+            self._save_to_cache(url, data)
+            return data
 
         except Exception as e:
-            error_response["error_msg"] = f"Subprocess Error: {str(e)}"
+            error_response["error_msg"] = f"Worker Pool Error: {str(e)}"
             return error_response
 
-    def take_screenshot(self, url, text_to_highlight):
+    def take_screenshot(self, url, text_to_highlight, snapshot_path=None, run_id=None, row=None):
         """
         MODO 2: Captura de Evidencia (Nuevo).
         Llama al worker con el comando "screenshot" y un JSON de configuración.
+        Si hay instantánea del scraping (`snapshot_path`), el worker la renderiza sin red.
+        La imagen se archiva por hash en el EvidenceStore y se anota (run_id, row) en su índice.
         """
         if not url: return None
         
@@ -63,53 +214,45 @@ class Scraper:
         preview_text = text_to_highlight[:30] + "..." if text_to_highlight else "Sin texto"
         print(f"📸 Generando Evidencia: {url} (Highlight: '{preview_text}')")
         
-        # 1. Definir ruta de salida única
-        try:
-            domain = urlparse(url).netloc.replace("www.", "").replace(".", "_")
-            if not domain: domain = "unknown_domain"
-        except:
-            domain = "unknown_domain"
-            
-        timestamp = datetime.now().strftime("%H%M%S")
-        filename = f"{domain}_{timestamp}.png"
-        
-        # Aseguramos carpeta evidence
-        evidence_dir = "evidence"
-        os.makedirs(evidence_dir, exist_ok=True)
-        output_path = os.path.join(evidence_dir, filename)
+        # 1. Ruta provisional única (el nombre definitivo sale del hash del contenido)
+        output_path = self.evidence_store.temp_path(uuid.uuid4().hex)
         
         # 2. Configurar el payload para el worker
-        config = {
+        shot_config = {
             "url": url,
             "text": text_to_highlight,
-            "path": output_path
+            "path": os.path.abspath(output_path),
+            "profile": self.screenshot_profile,
+            "snapshot": snapshot_path,
+            "full_page": config.EVIDENCE_CAPTURE == "full",
+            "quality": self.evidence_store.quality
         }
         
+        # Renderizar la instantánea no toca la web: no hace falta hueco de cortesía por dominio
+        offline = bool(snapshot_path) and os.path.exists(snapshot_path)
+        
         try:
-            # LLAMADA AL WORKER EN MODO SCREENSHOT
-            # Argumentos: [worker.py, "screenshot", '{json_config}']
-            result = subprocess.run(
-                [sys.executable, self.worker_path, "screenshot", json.dumps(config)],
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
+            # LLAMADA AL POOL EN MODO SCREENSHOT
+            with (nullcontext() if offline else self.host_limiter.slot(url)):
+                reply = self.pool.request("screenshot", {"config": shot_config}, timeout=config.SCREENSHOT_JOB_TIMEOUT)
             
             # 3. Analizar respuesta
-            try:
-                # El worker imprime un JSON por stdout
-                response = json.loads(result.stdout)
-                
-                if response.get("success"):
-                    print(f"✅ Evidencia guardada: {output_path}")
-                    return output_path
+            response = reply.get("result") or {}
+            if response.get("readiness"):
+                self._count_readiness([response["readiness"]])
+            if reply.get("ok") and response.get("success"):
+                self._count_evidence(f"rendered_{response.get('source', 'live')}")
+                evidence_path, entry = self.evidence_store.store(output_path, run_id=run_id, row=row, url=url)
+                if entry["deduped"]:
+                    self._count_evidence("deduped")
                 else:
-                    print(f"⚠️ Fallo en worker screenshot: {result.stdout}")
-                    return None
-            except json.JSONDecodeError:
-                print(f"⚠️ Error decodificando respuesta del worker: {result.stdout}")
+                    self._count_evidence("bytes", entry["bytes"])
+                print(f"✅ Evidencia guardada: {evidence_path}")
+                return evidence_path
+            else:
+                print(f"⚠️ Fallo en worker screenshot: {reply.get('error') or response}")
                 return None
                 
         except Exception as e:
-            print(f"⚠️ Error subprocess screenshot: {e}")
+            print(f"⚠️ Error pool screenshot: {e}")
             return None
\ No newline at end of file
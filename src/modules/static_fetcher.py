@@ -0,0 +1,211 @@
+import re
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core import config
+from modules.deep_crawl import rank_links, pick_evidence
+from modules.text_cleaner import clean_pages
+from modules.junk_detector import JunkDetector, junk_message
+
+
+# Señales típicas de webs que se pintan con JavaScript (SPA): el HTML llega casi vacío
+SPA_SHELL_PATTERN = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>'
+    r'|window\.__NUXT__|__NEXT_DATA__|ng-version=|data-reactroot',
+    re.IGNORECASE
+)
+# Aviso "activa JavaScript": sólo cuenta si además hay poco texto (muchos WordPress lo llevan en <noscript>)
+JS_REQUIRED_PATTERN = re.compile(r'(?:enable|activa|habilita)[^<]{0,40}javascript', re.IGNORECASE)
+
+# Etiquetas cuyo contenido no es texto visible
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+
+# Etiquetas de bloque: metemos salto de línea para imitar inner_text()
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "header", "footer", "nav", "li", "ul", "ol",
+    "h1", "h2", "h3", "h4", "h5", "h6", "tr", "table", "br", "main", "aside", "form"
+}
+
+
+class _PageParser(HTMLParser):
+    """Parser ligero (stdlib): título, texto visible y enlaces <a>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.links = []     # [(href, texto)]
+        self._chunks = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._link_href = None
+        self._link_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "a":
+            self._link_href = dict(attrs).get("href")
+            self._link_text = []
+        if tag in BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "a" and self._link_href is not None:
+            self.links.append((self._link_href, " ".join("".join(self._link_text).split())))
+            self._link_href = None
+        if tag in BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_depth:
+            return
+        self._chunks.append(data)
+        if self._link_href is not None:
+            self._link_text.append(data)
+
+    @property
+    def text(self):
+        lines = (" ".join(line.split()) for line in "".join(self._chunks).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+class StaticFetcher:
+    """
+    Nivel 1 del scraping: GET HTTP plano (con pool de conexiones) + parser HTML ligero.
+    Devuelve el mismo dict que worker.run_scrape o None si hay que escalar a Chromium.
+    """
+
+    def __init__(self, pool_maxsize=None):
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": config.USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml",
+            "Accept-Language": "es-ES,es;q=0.9,en;q=0.8"
+        })
+        self.junk_detector = JunkDetector()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_maxsize or config.POOL_SIZE * 4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, url):
+        """GET acotado en tamaño. Devuelve (response, html) o lanza la excepción de requests."""
+        with self.session.get(url, timeout=config.STATIC_TIMEOUT, stream=True, allow_redirects=True) as resp:
+            raw = bytearray()
+            for chunk in resp.iter_content(chunk_size=65536):
+                raw.extend(chunk)
+                if len(raw) >= config.STATIC_MAX_BYTES:
+                    break
+
+            encoding = resp.encoding
+            if not encoding or encoding.lower() == "iso-8859-1":
+                # requests asume latin-1 si no hay charset: mejor adivinar por el contenido
+                encoding = resp.apparent_encoding or "utf-8"
+            return resp, bytes(raw).decode(encoding, errors="replace")
+
+    def fetch(self, url):
+        """
+        Devuelve (resultado, motivo). Si resultado es None hay que escalar a Playwright
+        y `motivo` explica por qué ('connection', 'http_4xx', 'not_html', 'js_rendered', 'short_text',
+        'static_error'). Nunca lanza: cualquier fallo del nivel estático (HTML raro que rompe el
+        parser, codificación desconocida...) se escala a Chromium en vez de perder la fila.
+        """
+        try:
+            return self._fetch(url)
+        except Exception as e:
+            print(f"⚠️ Fallo en la descarga estática de {url}, se escala a Chromium: {e}")
+            return None, "static_error"
+
+    def _fetch(self, url):
+        url = str(url).strip()
+        if not url.startswith('http'): url = f'https://{url}'
+
+        try:
+            resp, html = self._get(url)
+        except requests.RequestException:
+            return None, "connection"
+
+        result = {
+            "status": resp.status_code,
+            "is_junk": False,
+            "text_content": "",
+            "error_msg": None,
+            "url_evidencia": resp.url,
+            "tier": "static"
+        }
+
+        # JUNK CHECK TEMPRANO: redirecciones (parking/registradores) y cabeceras, antes de parsear
+        chain = [r.url for r in resp.history] + [resp.url]
+        verdict = self.junk_detector.check_response(chain, resp.headers, html if resp.status_code == 200 else None)
+        if verdict:
+            return self._junk(result, verdict, f"URL FINAL: {resp.url}"), None
+
+        if resp.status_code >= 400:
+            return None, f"http_{resp.status_code}"
+        if "html" not in resp.headers.get("Content-Type", "text/html").lower():
+            return None, "not_html"
+        if SPA_SHELL_PATTERN.search(html):
+            return None, "js_rendered"
+
+        page = _PageParser()
+        page.feed(html)
+        title = " ".join(page.title.split())
+        body = page.text
+
+        # JUNK CHECK DE TEXTO (mismo detector que el worker)
+        verdict = self.junk_detector.check_text(title + " " + body[:1000])
+        if verdict:
+            return self._junk(result, verdict, f"TITULO: {title}\nTEXTO: {body[:500]}..."), None
+
+        if len(body) < config.STATIC_MIN_TEXT_CHARS * 2 and JS_REQUIRED_PATTERN.search(html):
+            return None, "js_rendered"
+
+        if len(body) < config.STATIC_MIN_TEXT_CHARS:
+            return None, "short_text"
+
+        pages = [{"label": f"HOME ({title})", "url": resp.url, "text": body, "score": 0}]
+
+        # DEEP CRAWL estático: top K subpáginas relevantes descargadas en paralelo (dentro del
+        # hueco de cortesía de la home: ver MAX_PER_HOST en config)
+        ranked = rank_links(page.links, resp.url)
+        if ranked:
+            with ThreadPoolExecutor(max_workers=len(ranked)) as executor:
+                for sub_page in executor.map(lambda item: self._fetch_subpage(*item), ranked):
+                    if sub_page:
+                        pages.append(sub_page)
+
+        result["url_evidencia"] = pick_evidence(pages, resp.url)
+        result["text_content"], result["text_stats"] = clean_pages(pages)
+        return result, None
+
+    @staticmethod
+    def _junk(result, verdict, text_content):
+        result["status"] = 200
+        result["is_junk"] = True
+        result["text_content"] = text_content
+        result["error_msg"] = junk_message(verdict)
+        result["junk_rule"] = verdict
+        return result
+
+    def _fetch_subpage(self, score, url):
+        try:
+            resp, html = self._get(url)
+            if resp.status_code >= 400:
+                return None
+            parser = _PageParser()
+            parser.feed(html)
+        except Exception:
+            # Una subpágina rota no invalida la home ya descargada
+            return None
+        return {"label": f"EXTRA ({resp.url})", "url": resp.url, "text": parser.text, "score": score}
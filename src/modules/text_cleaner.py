@@ -0,0 +1,103 @@
+import re
+from collections import Counter
+
+
+# Banners de cookies / consentimiento (multi-idioma). Sólo en líneas cortas (COOKIE_MAX_CHARS):
+# - botones y frases que sólo salen en un banner,
+# - menciones a cookies/privacidad/RGPD sólo si además "suenan" a banner (usamos, aceptas, navegando...).
+#   Así "Consultoría GDPR y protección de datos" (un servicio real) no se pierde.
+BANNER_PATTERN = re.compile(
+    r'aceptar todas|rechazar todas|accept all|reject all|configurar preferencias|manage preferences'
+    r'|^(?:aceptar|rechazar|accept|reject|ok|entendido|got it)$',
+    re.IGNORECASE
+)
+CONSENT_PATTERN = re.compile(
+    r'cookie|consentimiento|consent|gdpr|rgpd|política de privacidad|privacy policy',
+    re.IGNORECASE
+)
+BANNER_CONTEXT_PATTERN = re.compile(
+    r'\b(?:utiliza|utilizamos|usamos|usa|we use|uses|this (?:site|website)|este (?:sitio|portal|web)|nuestra web'
+    r'|naveg|brows|acept|accept|agree|consiente|preferencias|preferences|más información|more information|continu)',
+    re.IGNORECASE
+)
+COOKIE_MAX_CHARS = 300
+
+# Señales de decisión (grupo/filial/fabricación): una línea que las contenga se conserva
+# una vez aunque se repita en todas las páginas ("Una empresa del Grupo X" en el pie)
+SIGNAL_PATTERN = re.compile(
+    r'grupo|group|filial|subsidiar|holding|matriz|parent company|gruppo|groupe|konzern'
+    r'|fabric|manufactur|planta de|plant|factory|usine|stabiliment',
+    re.IGNORECASE
+)
+
+# Pies de página: copyright y filas de enlaces legales
+FOOTER_PATTERN = re.compile(
+    r'^(?:©|\(c\)|copyright)|todos los derechos reservados|all rights reserved'
+    r'|^(?:(?:aviso legal|legal notice|privacidad|privacy|cookies|mapa del sitio|sitemap|contacto|contact)[\s|·•/-]*){2,}$',
+    re.IGNORECASE
+)
+
+# Líneas "de menú": pocas palabras y presentes en TODAS las páginas (mínimo MENU_MIN_PAGES).
+# Con menos páginas no se distingue el menú de un servicio que la home y su subpágina repiten
+# ("Asesoría fiscal y contable"): se conserva la primera copia y el resto son duplicados.
+MENU_MAX_WORDS = 6
+MENU_MIN_PAGES = 3
+
+
+def _key(line):
+    return ' '.join(line.lower().split())
+
+
+def clean_pages(pages):
+    """
+    Quita boilerplate y duplicados del texto de varias páginas (home + subpáginas).
+      - banners de cookies y pies de copyright/enlaces legales,
+      - líneas cortas presentes en todas las páginas, si hay al menos MENU_MIN_PAGES (menús, pies),
+      - líneas ya vistas en páginas anteriores (se conserva la primera copia; las cortas
+        con señales de grupo/fabricación nunca cuentan como menú: un pie tipo "Empresa del
+        Grupo X" es justo lo que buscamos).
+    pages: [{"label", "text"}]. Devuelve (texto_compacto, estadísticas).
+    """
+    # En cuántas páginas aparece cada línea
+    page_frequency = Counter()
+    for page in pages:
+        page_frequency.update({_key(line) for line in page["text"].splitlines() if line.strip()})
+
+    stats = {"chars_in": 0, "chars_out": 0, "lines_in": 0, "lines_out": 0,
+             "dropped": {"cookie": 0, "footer": 0, "menu": 0, "duplicate": 0}}
+    seen = set()
+    blocks = []
+    menu_pages = len(pages) if len(pages) >= MENU_MIN_PAGES else None
+
+    for page in pages:
+        stats["chars_in"] += len(page["text"])
+        kept = []
+        for line in page["text"].splitlines():
+            key = _key(line)
+            if not key:
+                continue
+            stats["lines_in"] += 1
+
+            if len(key) < COOKIE_MAX_CHARS and (
+                BANNER_PATTERN.search(key) or (CONSENT_PATTERN.search(key) and BANNER_CONTEXT_PATTERN.search(key))
+            ):
+                stats["dropped"]["cookie"] += 1
+            elif len(key) < 200 and FOOTER_PATTERN.search(key):
+                stats["dropped"]["footer"] += 1
+            elif (page_frequency[key] == menu_pages and len(key.split()) <= MENU_MAX_WORDS
+                  and not SIGNAL_PATTERN.search(key)):
+                stats["dropped"]["menu"] += 1
+            elif key in seen:
+                stats["dropped"]["duplicate"] += 1
+            else:
+                seen.add(key)
+                kept.append(' '.join(line.split()))
+
+        if kept:
+            stats["lines_out"] += len(kept)
+            blocks.append(f"--- {page['label']} ---\n" + "\n".join(kept))
+
+    text = "\n\n".join(blocks)
+    stats["chars_out"] = len(text)
+    stats["reduction_ratio"] = round(1 - stats["chars_out"] / stats["chars_in"], 3) if stats["chars_in"] else 0.0
+    return text, stats
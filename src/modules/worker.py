@@ -1,18 +1,51 @@
+import os
 import sys
 import json
 import time
+import hashlib
+from pathlib import Path
+from contextlib import contextmanager
 from urllib.parse import urljoin
 from datetime import datetime
 import nest_asyncio
 from playwright.sync_api import sync_playwright
 
+# El worker se lanza como script (python src/modules/worker.py): añadimos src/ al path
+# para poder compartir configuración y utilidades con el resto del proyecto.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Alias: 'config' ya es el nombre del dict de trabajo en take_screenshot
+from core import config as settings
+from modules.resource_blocking import apply_resource_profile, keeps_visuals
+from modules.readiness import wait_until_ready, wait_for_paint
+from modules.deep_crawl import rank_links, pick_evidence
+from modules.text_cleaner import clean_pages
+from modules.junk_detector import JunkDetector, junk_message
+
 nest_asyncio.apply()
 
+# Un único detector por proceso: el regex de palabras clave se compila una sola vez
+JUNK_DETECTOR = JunkDetector()
+
+
+@contextmanager
+def browser_session(browser=None):
+    """Reutiliza el navegador del pool si nos lo pasan; si no, lanza uno propio (modo CLI)."""
+    if browser is not None:
+        yield browser
+        return
+
+    with sync_playwright() as p:
+        own_browser = p.chromium.launch(headless=True)
+        try:
+            yield own_browser
+        finally:
+            own_browser.close()
+
 # --- FUNCIONES DE UTILIDAD VISUAL (RPA) ---
 
-def inject_audit_banner(page):
-    """Inyecta una cinta roja de auditoría en la parte superior."""
-    ahora_texto = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+def inject_audit_banner(page, stamp=None):
+    """Inyecta una cinta roja de auditoría en la parte superior (por defecto con la hora actual)."""
+    ahora_texto = (stamp or datetime.now()).strftime("%d/%m/%Y %H:%M:%S")
     js = f"""
         const banner = document.createElement('div');
         banner.innerText = 'EVIDENCIA AUDITADA: {ahora_texto}';
@@ -90,10 +123,146 @@ def highlight_text_laser(page, text):
         pass
     
 
+# --- DEEP CRAWL ---
+
+def deep_crawl(context, home_page, deadline, result):
+    """
+    Abre en paralelo (una pestaña por enlace) las K subpáginas mejor puntuadas del mismo sitio,
+    dentro del presupuesto de tiempo. Devuelve [{"label", "url", "text", "score"}].
+    Las subpáginas con HTTP >= 400 se descartan, como en el nivel estático: una 404 trae la
+    plantilla completa del sitio y acabaría en el texto, la evidencia o la instantánea.
+    """
+    crawl_info = {"candidates": 0, "visited": 0, "errors": []}
+    result["deep_crawl"] = crawl_info
+
+    try:
+        links = home_page.eval_on_selector_all(
+            "a[href]", "els => els.slice(0, 400).map(a => [a.getAttribute('href'), a.innerText || a.title || ''])"
+        )
+    except Exception as e:
+        crawl_info["errors"].append(f"links: {e}")
+        return []
+
+    ranked = rank_links(links, home_page.url)
+    crawl_info["candidates"] = len(ranked)
+
+    # Lanzamos todas las navegaciones sin bloquear: el navegador las carga a la vez
+    tabs = []
+    for score, link_url in ranked:
+        try:
+            tab = context.new_page()
+            # Estado HTTP del documento principal (el último de la cadena de redirecciones)
+            status = {}
+            tab.on("response", lambda response, tab=tab, status=status: status.update(code=response.status)
+                   if response.request.is_navigation_request() and response.frame == tab.main_frame else None)
+            tab.evaluate("u => { window.location.href = u; }", link_url)
+            tabs.append((score, link_url, tab, status))
+        except Exception as e:
+            crawl_info["errors"].append(f"{link_url}: {e}")
+
+    pages = []
+    for score, link_url, tab, status in tabs:
+        remaining_ms = (deadline - time.monotonic()) * 1000
+        if remaining_ms <= 0:
+            crawl_info["errors"].append(f"{link_url}: presupuesto de tiempo agotado")
+            continue
+        try:
+            tab.wait_for_url(lambda u: not u.startswith("about:"), wait_until="domcontentloaded", timeout=remaining_ms)
+            if status.get("code", 0) >= 400:
+                crawl_info["errors"].append(f"{link_url}: HTTP {status['code']}")
+                continue
+            result["readiness"].append(wait_until_ready(tab, "deep"))
+            text = tab.locator('body').inner_text()
+            pages.append({"label": f"EXTRA ({tab.url})", "url": tab.url, "text": text, "score": score, "page": tab})
+            crawl_info["visited"] += 1
+        except Exception as e:
+            crawl_info["errors"].append(f"{link_url}: {str(e)[:120]}")
+
+    return pages
+
+
+# --- INSTANTÁNEA DE EVIDENCIA ---
+
+def capture_snapshot(page):
+    """
+    Guarda la página tal y como se analizó en un MHTML autocontenido (CDP Page.captureSnapshot).
+    Devuelve la ruta absoluta o None si no se pudo (o si pesa demasiado).
+    """
+    try:
+        cdp = page.context.new_cdp_session(page)
+        data = cdp.send("Page.captureSnapshot", {"format": "mhtml"})["data"]
+        cdp.detach()
+    except Exception:
+        return None
+
+    if len(data) > settings.SNAPSHOT_MAX_BYTES:
+        return None
+
+    # Nombre por hash del contenido: un scrape posterior de la misma URL no pisa la instantánea
+    # a la que apuntan la caché o las evidencias pendientes. Se escribe en un temporal propio
+    # del proceso y se renombra (atómico): dos workers con la misma página no se mezclan.
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+    encoded = data.encode("utf-8")
+    filename = hashlib.sha256(encoded).hexdigest()[:24] + ".mhtml"
+    path = os.path.abspath(os.path.join(settings.SNAPSHOT_DIR, filename))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(encoded)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return None
+    return path
+
+
 # --- MODO 1: SCRAPING (Tu lógica original mejorada) ---
 
-def run_scrape(url):
-    headless = True
+def follow_masked_frame(page, timeout):
+    """
+    Reenvío "enmascarado" de registradores: la home es un <frameset> (o un <iframe> a pantalla
+    completa sin más texto) con la web real dentro. Navegamos a la URL del marco para leer y
+    capturar su contenido. Devuelve la URL seguida o None.
+    Se llama con la página ya lista (tras wait_until_ready): una web JS todavía vacía con un
+    vídeo o un mapa incrustado no es un reenvío. El iframe debe ocupar casi toda la ventana
+    o ser el único elemento del body.
+    """
+    try:
+        frame_url = page.evaluate("""() => {
+            const frame = document.querySelector('frameset frame[src]');
+            if (frame) return frame.src.startsWith('http') ? frame.src : null;
+            const body = document.body;
+            if (!body || body.tagName !== 'BODY' || body.innerText.trim().length >= 50) return null;
+            const iframe = body.querySelector('iframe[src]');
+            if (!iframe || !iframe.src.startsWith('http')) return null;
+            const children = [...body.children].filter(el => !['SCRIPT', 'NOSCRIPT', 'STYLE', 'LINK'].includes(el.tagName));
+            const onlyChild = children.length === 1 && (children[0] === iframe || children[0].contains(iframe));
+            const rect = iframe.getBoundingClientRect();
+            const covers = rect.width >= window.innerWidth * 0.9 && rect.height >= window.innerHeight * 0.9;
+            return onlyChild || covers ? iframe.src : null;
+        }""")
+        if not frame_url:
+            return None
+        page.goto(frame_url, timeout=timeout, wait_until='domcontentloaded')
+        return frame_url
+    except Exception:
+        return None
+
+
+def _junk_result(result, verdict, text_content):
+    """Rellena el resultado de una web basura indicando qué regla saltó y en qué fase."""
+    result["status"] = 200
+    result["is_junk"] = True
+    result["text_content"] = text_content
+    result["error_msg"] = junk_message(verdict)
+    result["junk_rule"] = verdict
+    return result
+
+
+def run_scrape(url, browser=None, profile=None):
     timeout = 20000
     
     result = {
@@ -104,14 +273,6 @@ def run_scrape(url):
         "url_evidencia": url # Por defecto, la evidencia es la URL de entrada
     }
     
-    keywords_junk = [
-        "domain for sale", "comprar este dominio", "parked free", "godaddy", 
-        "sedo", "hugedomains", "namecheap", "this domain is available", 
-        "buy this domain", "dominio a la venta", "site under construction",
-        "coming soon", "renew now"
-    ]
-    keywords_nav = ["servicios", "services", "about", "nosotros", "grupo", "group", "quienes somos"]
-
     # Limpieza URL
     if not url or str(url) == 'nan': 
         return {"status": 0, "is_junk": False, "text_content": "", "error_msg": "URL Nula"}
@@ -119,95 +280,81 @@ def run_scrape(url):
     if not url.startswith('http'): url = f'https://{url}'
 
     result["url_evidencia"] = url
+    profile = profile or settings.SCRAPE_RESOURCE_PROFILE
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=headless)
-            context = browser.new_context(user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        with browser_session(browser) as browser:
+            context = browser.new_context(user_agent=settings.USER_AGENT)
+            # Sólo leemos texto: fuera imágenes, fuentes, vídeo y analítica
+            result["blocking"] = apply_resource_profile(context, profile)
             page = context.new_page()
 
             # 1. HOME
             try:
                 response = page.goto(url, timeout=timeout, wait_until='domcontentloaded')
-                page.wait_for_timeout(1500)
                 status = response.status if response else 0
                 result["status"] = status
             except Exception as e:
-                browser.close()
+                context.close()
                 result["error_msg"] = "Timeout/Error Conexión"
                 return {"status": 0, "is_junk": False, "text_content": "", "error_msg": "Timeout/Error Conexión"}
 
+            # 2a. JUNK CHECK TEMPRANO: redirecciones y cabeceras, sin esperar ni leer el DOM
+            if response:
+                chain = [page.url]
+                request = response.request
+                while request:
+                    chain.append(request.url)
+                    request = request.redirected_from
+                try:
+                    html = response.text() if status == 200 else None
+                except Exception:
+                    html = None
+                verdict = JUNK_DETECTOR.check_response(chain, response.headers, html)
+                if verdict:
+                    context.close()
+                    return _junk_result(result, verdict, f"URL FINAL: {chain[0]}")
+
             if status >= 400:
-                browser.close()
+                context.close()
                 result["error_msg"] = f"HTTP {status}"
                 return {"status": status, "is_junk": False, "text_content": "", "error_msg": f"HTTP {status}"}
 
-            # 2. JUNK CHECK
+            # Espera adaptativa: volvemos en cuanto el texto deja de cambiar
+            result["readiness"] = [wait_until_ready(page, "scrape")]
+
+            # La web real puede estar dentro de un marco (reenvío enmascarado del registrador)
+            masked_frame = follow_masked_frame(page, timeout)
+            if masked_frame:
+                result["masked_frame"] = masked_frame
+                result["readiness"].append(wait_until_ready(page, "scrape"))
+
+            # 2b. JUNK CHECK DE TEXTO (regex precompilado) + redirecciones por JS durante la carga
+            page_url = page.url # URL final tras redirecciones
             title = page.title()
             body = page.locator('body').inner_text()
-            full_text = (title + " " + body[:1000]).lower()
             
-            for kw in keywords_junk:
-                if kw in full_text:
-                    browser.close()
-                    result["status"] = 200
-                    result["is_junk"] = True
-                    result["text_content"] = f"TITULO: {title}\nTEXTO: {body[:500]}..."
-                    result["error_msg"] = f"Junk detectado: {kw}"
-                    return result
-
-            content = f"--- HOME ({title}) ---\n{body}\n\n"
-
-            # 3. DEEP SCRAPING
-            try:
-                links = page.get_by_role("link").all()
-                target = None
-                for link in links[:50]:
-                    try:
-                        href = link.get_attribute('href')
-                        txt = link.inner_text().lower()
-                        if href and any(k in txt for k in keywords_nav):
-                            target = href
-                            break
-                    except: continue
-                
-                if target_url:
-                    # Construcción URL absoluta robusta
-                    if not target_url.startswith('http'):
-                        base = url.rstrip('/')
-                        # Si target empieza con /, quitamos la base y concatenamos, o manejamos la unión
-                        if target_url.startswith('/'):
-                            # Lógica simple de unión: base + target
-                            # Ojo: si base tiene path, esto podría fallar, pero para home suele valer
-                            # Mejor usar la url base del objeto page por si hubo redirección
-                            current_url_base = page.url.rstrip('/') 
-                            # Si es root relative
-                            import urllib.parse
-                            target_url = urllib.parse.urljoin(page.url, target_url)
-                        else:
-                            target_url = f"{base}/{target_url}"
-                    
-                    # Navegamos
-                    page.goto(target_url, timeout=20000, wait_until='domcontentloaded')
-                    
-                    # Espera robusta para carga de JS
-                    page.wait_for_timeout(2000)
-                    
-                    secondary_text = page.locator('body').inner_text()
-                    
-                    # Validación: Si hay suficiente texto, nos quedamos esta URL como evidencia
-                    if len(secondary_text) > 100:
-                        content += f"--- EXTRA ({target_url}) ---\n{secondary_text}"
-                        result["url_evidencia"] = page.url # ACTUALIZAMOS LA EVIDENCIA
-                    else:
-                        content += "\n(Sección extra visitada pero con poco texto)"
-                        
-            except Exception as e:
-                # No fallamos todo el proceso si falla el deep scraping, solo lo logueamos en el texto
-                content += f"\n[Error en navegación extra: {str(e)}]"
+            verdict = JUNK_DETECTOR.check_redirects([page_url]) or JUNK_DETECTOR.check_text(title + " " + body[:1000])
+            if verdict:
+                context.close()
+                return _junk_result(result, verdict, f"TITULO: {title}\nTEXTO: {body[:500]}...")
 
-            browser.close()
-            result["text_content"] = ' '.join(content.split()) # Limpieza de espacios
+            pages = [{"label": f"HOME ({title})", "url": page.url, "text": body, "score": 0, "page": page}]
+
+            # 3. DEEP CRAWL: top K subpáginas relevantes en pestañas paralelas
+            deadline = time.monotonic() + settings.DEEP_CRAWL_TIME_BUDGET
+            pages += deep_crawl(context, page, deadline, result)
+
+            result["url_evidencia"] = pick_evidence(pages, page_url)
+            # Copia local de la página de evidencia, antes de cerrar el contexto. Con un perfil sin
+            # imágenes/fuentes la copia daría una evidencia degradada: mejor la web en vivo después
+            if settings.SNAPSHOT_ENABLED and keeps_visuals(profile):
+                evidence_page = next((p["page"] for p in pages if p["url"] == result["url_evidencia"]), page)
+                result["snapshot_path"] = capture_snapshot(evidence_page)
+
+            context.close()
+            # Fuera menús, pies, banners de cookies y líneas repetidas entre páginas
+            result["text_content"], result["text_stats"] = clean_pages(pages)
             return result
 
     except Exception as e:
@@ -218,52 +365,130 @@ def run_scrape(url):
     
 # --- MODO 2: SCREENSHOT (Nueva Funcionalidad Fusionada) ---
 
-def take_screenshot(config):
+def take_screenshot(config, browser=None):
     url = config.get("url")
     text_to_highlight = config.get("text")
     output_path = config.get("path")
+    snapshot = config.get("snapshot")
     
     response = {"success": False, "path": ""}
 
+    # Primero la instantánea del scraping (sin red, idéntica a lo analizado); si falla, la web en vivo
+    sources = []
+    if snapshot and os.path.exists(snapshot):
+        sources.append(("snapshot", Path(snapshot).as_uri()))
+    sources.append(("live", url))
+
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(viewport={'width': 1920, 'height': 1080}) 
-            page = context.new_page()
-            
-            try:
-                page.goto(url, timeout=45000, wait_until="domcontentloaded")
-                page.wait_for_timeout(2000) 
-            except:
-                browser.close()
-                return response 
+        with browser_session(browser) as browser:
+            for source, target in sources:
+                offline = source == "snapshot"
+                context = browser.new_context(viewport={'width': 1920, 'height': 1080}, offline=offline)
+                if not offline:
+                    # La evidencia debe verse como la web real: por defecto perfil de fidelidad completa
+                    apply_resource_profile(context, config.get("profile") or settings.SCREENSHOT_RESOURCE_PROFILE)
+                page = context.new_page()
+                
+                try:
+                    page.goto(target, timeout=15000 if offline else 45000, wait_until="domcontentloaded")
+                    response["readiness"] = wait_until_ready(page, "screenshot")
+                    response["source"] = source
+                    break
+                except:
+                    context.close()
+            else:
+                return response
 
             # APLICAMOS LA MAGIA VISUAL
             if text_to_highlight:
                 highlight_text_laser(page, text_to_highlight)
-                page.wait_for_timeout(500)
 
-            inject_audit_banner(page)
-            page.wait_for_timeout(500)
+            # Sobre la instantánea, la fecha auditada es la de la captura del contenido (y la imagen
+            # sale idéntica entre ejecuciones, lo que permite deduplicarla en el almacén)
+            stamp = datetime.fromtimestamp(os.path.getmtime(snapshot)) if response["source"] == "snapshot" else None
+            inject_audit_banner(page, stamp)
+            wait_for_paint(page) # Basta con que se pinten el highlight y la cinta
             
-            page.screenshot(path=output_path, full_page=True)
+            # Por defecto sólo el viewport (el resaltado ya está centrado); "full_page" para la página entera
+            shot_options = {"path": output_path, "full_page": bool(config.get("full_page"))}
+            if output_path.lower().endswith((".jpg", ".jpeg")):
+                shot_options["quality"] = int(config.get("quality") or settings.EVIDENCE_QUALITY)
+            page.screenshot(**shot_options)
             
             response["success"] = True
             response["path"] = output_path
             
-            browser.close()
+            context.close()
             return response
 
     except Exception as e:
         return response
 
 
+# --- MODO 3: SERVIDOR PERSISTENTE (Pool de workers) ---
+
+def serve():
+    """
+    Bucle de trabajo para el WorkerPool.
+    Lee un JSON por línea en stdin ({"id", "mode", ...}) y responde otro por stdout.
+    Un único Chromium por proceso; cada trabajo abre y cierra su propio contexto.
+    """
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr # Cualquier print suelto no debe romper el protocolo
+
+    with sync_playwright() as p:
+        browser = None
+
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+
+            job_id = None
+            try:
+                job = json.loads(line)
+                job_id = job.get("id")
+
+                # Relanzamos el navegador si es la primera vez o si se ha caído
+                if browser is None or not browser.is_connected():
+                    browser = p.chromium.launch(headless=True)
+
+                mode = job.get("mode")
+                if mode == "scrape":
+                    data = run_scrape(job.get("url"), browser=browser, profile=job.get("profile"))
+                elif mode == "screenshot":
+                    data = take_screenshot(job.get("config", {}), browser=browser)
+                else:
+                    raise ValueError(f"Modo desconocido: {mode}")
+
+                reply = {"id": job_id, "ok": True, "result": data}
+            except Exception as e:
+                reply = {"id": job_id, "ok": False, "error": str(e)}
+
+            # Si un trabajo petó a medias, cerramos los contextos huérfanos para no acumular memoria
+            try:
+                for leftover in (browser.contexts if browser else []):
+                    leftover.close()
+            except Exception:
+                pass
+
+            protocol_out.write(json.dumps(reply) + "\n")
+            protocol_out.flush()
+
+        if browser is not None:
+            browser.close()
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         arg = sys.argv[1]
         
+        # Modo pool: proceso persistente que atiende trabajos por stdin
+        if arg == "serve":
+            serve()
+
         # Si el argumento es "screenshot", esperamos un JSON en el 2º argumento
-        if arg == "screenshot":
+        elif arg == "screenshot":
             try:
                 config_json = sys.argv[2]
                 config = json.loads(config_json)
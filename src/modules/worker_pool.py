@@ -0,0 +1,145 @@
+import json
+import queue
+import atexit
+import itertools
+import subprocess
+import sys
+import threading
+
+
+class _WorkerProcess:
+    """
+    Un proceso `worker.py serve` de larga duración.
+    Habla un protocolo JSON por líneas: una petición por stdin -> una respuesta por stdout.
+    """
+
+    def __init__(self, worker_path):
+        self.proc = subprocess.Popen(
+            [sys.executable, worker_path, "serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        # Hilo lector: así podemos aplicar timeouts sin bloquearnos en readline()
+        self._replies = queue.Queue()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            self._replies.put(line)
+        self._replies.put(None)  # EOF: el proceso ha muerto
+
+    def is_alive(self):
+        return self.proc.poll() is None
+
+    def request(self, job, timeout):
+        """Envía un trabajo y espera su respuesta. Lanza TimeoutError o RuntimeError."""
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+        while True:
+            try:
+                line = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"Worker sin respuesta tras {timeout}s")
+
+            if line is None:
+                raise RuntimeError(f"Worker terminado (código {self.proc.poll()})")
+
+            try:
+                reply = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ruido en stdout: lo ignoramos
+
+            if reply.get("id") == job["id"]:
+                return reply
+
+    def close(self, timeout=5):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=timeout)
+        except Exception:
+            self.kill()
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class WorkerPool:
+    """
+    Pool de procesos worker persistentes.
+    Cada worker reutiliza un único Chromium y abre un contexto nuevo por trabajo,
+    así evitamos pagar arranque de proceso + navegador en cada URL.
+    Los procesos se lanzan bajo demanda (lazy) hasta `size`.
+    """
+
+    def __init__(self, worker_path, size=2):
+        self.worker_path = worker_path
+        self.size = max(1, int(size))
+        self._ids = itertools.count(1)
+
+        # Cada "slot" es un worker vivo o None (hueco libre que se lanzará al usarlo)
+        self._slots = queue.Queue()
+        for _ in range(self.size):
+            self._slots.put(None)
+
+        self._all = []
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _acquire(self):
+        worker = self._slots.get()
+        if worker is not None and worker.is_alive():
+            return worker
+
+        try:
+            worker = _WorkerProcess(self.worker_path)
+        except Exception:
+            self._slots.put(None)  # Devolvemos el hueco para no perder capacidad
+            raise
+
+        with self._lock:
+            self._all.append(worker)
+        return worker
+
+    def _release(self, worker, healthy=True):
+        if healthy and worker.is_alive():
+            self._slots.put(worker)
+            return
+
+        worker.kill()
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+        self._slots.put(None)
+
+    def request(self, mode, payload, timeout):
+        """
+        Ejecuta un trabajo en el primer worker libre.
+        Devuelve siempre un dict: {"ok": bool, "result": ..., "error": str}.
+        """
+        job = {"id": next(self._ids), "mode": mode, **payload}
+        worker = self._acquire()
+        try:
+            reply = worker.request(job, timeout)
+        except Exception as e:
+            # Worker colgado o muerto: lo sacrificamos y se relanzará en el próximo uso
+            self._release(worker, healthy=False)
+            return {"ok": False, "error": str(e)}
+
+        self._release(worker)
+        return reply
+
+    def close(self):
+        """Cierra todos los workers. El pool sigue siendo utilizable (se relanzan bajo demanda)."""
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.close()
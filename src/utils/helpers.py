@@ -0,0 +1,28 @@
+from urllib.parse import urlparse
+
+
+def normalize_url(url):
+    """
+    Clave canónica de una web: sin esquema, sin 'www.', host en minúsculas y sin '/' final.
+    'https://www.Empresa.es/' y 'empresa.es' acaban siendo la misma clave.
+    """
+    url = str(url or '').strip()
+    if not url or url.lower() == 'nan':
+        return ''
+    if '://' not in url:
+        url = f'https://{url}'
+
+    try:
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+    except ValueError:
+        return url.lower()
+
+    if host.startswith('www.'):
+        host = host[4:]
+
+    path = parsed.path.rstrip('/')
+    key = host + path
+    if parsed.query:
+        key += '?' + parsed.query
+    return key